@@ -3,20 +3,29 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
-from json import load
-import networkx as nx
-from logger import logger
+from hashlib import sha256
+from logging import INFO
+from os import makedirs, path, replace, SEEK_END
+from pickle import dump, load as load_pickle, HIGHEST_PROTOCOL
+from re import search
+from CompactGraph import CompactGraph
+from JsonStream import JsonStream
+from logger import logger, hot, flush_hot
+
+# Bump when the parsed representation changes to invalidate cached graphs.
+GRAPH_CACHE_VERSION = 4
 
 class CircuitGraph(object):
-	def __init__(self, labeling, json_object=None, json_file='tmp/out_labelled.json'):
-		self.__redundant_graph = nx.DiGraph()
-		self.__graph = nx.DiGraph()
+	def __init__(self, labeling=None, json_object=None, json_file='tmp/out_labelled.json'):
+		self.__graph = CompactGraph([], [], [])
 		self.__labeling = labeling
-		self.__redundant_circuit = {}
-		self.__redundant_circuit['cells'] = {}
-		self.__redundant_circuit['wires'] = {}
-		self.__circuit = {}
-		self.__circuit['cells'] = {}
+		# The redundant graph is collected as plain lists while parsing and
+		# frozen into a CompactGraph afterwards.
+		self.__node_ids = {}
+		self.__node_names = []
+		self.__node_kinds = []
+		self.__edges = []
+		self.__edge_set = set()
 		self.__ports = {}
 		self.__outputs = []
 
@@ -27,89 +36,99 @@ class CircuitGraph(object):
 		self.__ignore = []
 
 		if json_object:
-			top_module = json_object['top_module']
-			self.__parse_json(json_object['modules'][top_module])
+			module = json_object['modules'][json_object['top_module']]
+			self.__parse_json((section, name, module[section][name])
+				for section in ('ports', 'cells', 'netnames') for name in module[section])
 		else:
-			with open(json_file, 'r') as filename:
-				json_object = load(filename)
-			top_module = json_object['top_module']
-			self.__parse_json(json_object['modules'][top_module])
-	
+			self.__stream_json(json_file)
+
+		self.__construct_redundant_graph()
+		flush_hot()
+		if labeling is not None:
+			self.set_labeling(labeling)
+
+	@staticmethod
+	def load(json_file, cache_dir='tmp/cache'):
+		# The parsed netlist does not depend on the labeling, so it is cached
+		# by the content hash of the netlist file.
+		digest = sha256()
+		with open(json_file, 'rb') as filename:
+			for chunk in iter(lambda: filename.read(1 << 20), b''):
+				digest.update(chunk)
+		cache_file = path.join(cache_dir, '{}_{}.graph'.format(
+			digest.hexdigest(), GRAPH_CACHE_VERSION))
+		if path.exists(cache_file):
+			with open(cache_file, 'rb') as filename:
+				return load_pickle(filename)
+		circuit = CircuitGraph(json_file=json_file)
+		makedirs(cache_dir, exist_ok=True)
+		with open(cache_file + '.part', 'wb') as filename:
+			dump(circuit, filename, HIGHEST_PROTOCOL)
+		replace(cache_file + '.part', cache_file)
+		return circuit
+
+	def set_labeling(self, labeling):
+		self.__labeling = labeling
 		self.__construct_graph()
 
-	def __parse_json(self, circuit_json):
-		netnames = []
-		ports = []
-		wires = {}
+	def __find_top_module(self, json_file):
+		# The top module is the last key of the netlist, so it is looked up in
+		# the tail of the file instead of scanning the whole document first.
+		with open(json_file, 'rb') as filename:
+			filename.seek(0, SEEK_END)
+			filename.seek(max(0, filename.tell() - 4096))
+			tail = filename.read().decode('utf-8', 'ignore')
+		match = search(r'"top_module"\s*:\s*"([^"]*)"\s*}\s*$', tail)
+		if match:
+			return match.group(1)
+		with open(json_file, 'r') as filename:
+			stream = JsonStream(filename)
+			for key in stream.iter_object():
+				if key == 'top_module':
+					return stream.read_value()
+				stream.skip_value()
+		logger.error('parse json: there is no top module in {}'.format(json_file))
+		exit(-1)
 
-		for p in circuit_json['ports']:
-			bits = circuit_json['ports'][p]['bits']
-			if circuit_json['ports'][p]['direction'] == 'output':
-				self.__outputs += bits
-			if 'label' in circuit_json['ports'][p]:
-				label = circuit_json['ports'][p]['label']
-			else:
-				label = None
-			self.__ports[p] = bits
-			i = 0
-			for b in bits:
-				ports.append(b)
-				self.__add_cell(b, 'port')
-				i += 1
-
-		for n in circuit_json['netnames']:
-			bits = circuit_json['netnames'][n]['bits']
-			for b in bits:
-				if b not in netnames:
-					netnames.append(b)
-				else:
-					logger.info('parse json: the netname {} already exists'.
-						format(b))
-
-		for c in circuit_json['cells']:
-			cell_type = circuit_json['cells'][c]['type']. \
-				split('_')[1].lower()
-			cell_num = c.split('$')[-1]
-			name = '{}_{}'.format(cell_type, cell_num)
-			self.__add_cell(name, cell_type)
-
-		for c in circuit_json['cells']:
-			cell_type = circuit_json['cells'][c]['type']. \
-				split('_')[1].lower()
-			cell_num = c.split('$')[-1]
-			name = '{}_{}'.format(cell_type, cell_num)
-			if 'port_directions' in circuit_json['cells'][c] and \
-				'connections' in circuit_json['cells'][c]:
-				directions = circuit_json['cells'][c]['port_directions']
-				connections = circuit_json['cells'][c]['connections']
-				for d in directions:
-					if type(connections[d][0]) != int:
-						if connections[d][0] not in netnames:
-							cname = 'const_{}'.format(connections[d][0])
-							netnames.append(cname)
-							self.__add_cell(cname, 'const')
-						else:
-							logger.info('parse json: the const cell {} already exists'.
-								format(connections[d][0]))
-					if directions[d] == 'input':
-							if type(connections[d][0]) != int:
-								self.__add_wire('const_{}'.
-									format(connections[d][0]), name)
-							else:
-								if connections[d][0] not in wires:
-									wires[connections[d][0]] = {}
-								if 'output' not in wires[connections[d][0]]:
-									wires[connections[d][0]]['output'] = []
-								wires[connections[d][0]]['output'].append(name)
-					elif directions[d] == 'output':
-						if connections[d][0] not in wires:
-							wires[connections[d][0]] = {}
-						if 'input' not in wires[connections[d][0]]:
-							wires[connections[d][0]]['input'] = []
-						wires[connections[d][0]]['input'].append(name)
+	def __stream_json(self, json_file):
+		top_module = self.__find_top_module(json_file)
+		with open(json_file, 'r') as filename:
+			stream = JsonStream(filename)
+			for key in stream.iter_object():
+				if key != 'modules':
+					stream.skip_value()
+					continue
+				for module in stream.iter_object():
+					if module == top_module:
+						self.__parse_json(self.__stream_module(stream))
+					else:
+						stream.skip_value()
+
+	def __stream_module(self, stream):
+		for section in stream.iter_object():
+			if section in ('ports', 'cells', 'netnames'):
+				for name in stream.iter_object():
+					yield section, name, stream.read_value()
 			else:
-				logger.warn('parse json: there is no port or connections for the cell {}'.
-					format(c))
+				stream.skip_value()
+
+	def __parse_json(self, entries):
+		netnames = set()
+		wires = {}
+
+		# Entries arrive one at a time in file order: ports, cells, netnames.
+		for section, name, entry in entries:
+			if section == 'ports':
+				self.__parse_port(name, entry)
+			elif section == 'cells':
+				self.__parse_cell(name, entry, wires)
+			elif section == 'netnames':
+				for b in entry['bits']:
+					if b not in netnames:
+						netnames.add(b)
+					else:
+						hot('parse json: duplicate netnames',
+							'parse json: the netname {} already exists', b, level=INFO)
 
 		for w in wires:
 			if 'input' in wires[w]:
@@ -119,144 +138,206 @@ class CircuitGraph(object):
 							self.__add_wire(i, o)
 					else:
 						self.__add_wire(i, w)
-						logger.warn('parse json: there is no output for wire {}'.
-							format(w))
+						hot('parse json: wires without output',
+							'parse json: there is no output for wire {}', w)
 			else:
 				for o in wires[w]['output']:
 					self.__add_wire(w, o)
-				logger.warn('parse json: there is no input for wire {}'.
-					format(w))
+				hot('parse json: wires without input',
+					'parse json: there is no input for wire {}', w)
+
+	def __parse_port(self, p, port):
+		bits = port['bits']
+		if port['direction'] == 'output':
+			self.__outputs += bits
+		self.__ports[p] = bits
+		for b in bits:
+			self.__add_cell(b, 'port')
+
+	def __parse_cell(self, c, cell, wires):
+		if not cell['type'].startswith('$_'):
+			logger.error('parse json: the cell {} instantiates the module {}, flatten the netlist or check it with --compositional'.
+				format(c, cell['type']))
+			exit(-1)
+		cell_type = cell['type'].split('_')[1].lower()
+		cell_num = c.split('$')[-1]
+		name = '{}_{}'.format(cell_type, cell_num)
+		self.__add_cell(name, cell_type)
+		if 'port_directions' in cell and 'connections' in cell:
+			directions = cell['port_directions']
+			connections = cell['connections']
+			for d in directions:
+				if type(connections[d][0]) != int:
+					cname = 'const_{}'.format(connections[d][0])
+					if cname not in self.__node_ids:
+						self.__add_cell(cname, 'const')
+					else:
+						hot('parse json: duplicate const cells',
+							'parse json: the const cell {} already exists', connections[d][0], level=INFO)
+				if directions[d] == 'input':
+						if type(connections[d][0]) != int:
+							self.__add_wire('const_{}'.
+								format(connections[d][0]), name)
+						else:
+							if connections[d][0] not in wires:
+								wires[connections[d][0]] = {}
+							if 'output' not in wires[connections[d][0]]:
+								wires[connections[d][0]]['output'] = []
+							wires[connections[d][0]]['output'].append(name)
+				elif directions[d] == 'output':
+					if connections[d][0] not in wires:
+						wires[connections[d][0]] = {}
+					if 'input' not in wires[connections[d][0]]:
+						wires[connections[d][0]]['input'] = []
+					wires[connections[d][0]]['input'].append(name)
+		else:
+			hot('parse json: cells without ports or connections',
+				'parse json: there is no port or connections for the cell {}', c)
 
 	def __add_cell(self, name, ctype, label=None):
-		if name not in self.__redundant_circuit['cells']:
-			self.__redundant_circuit['cells'][name] = {}
-			self.__redundant_circuit['cells'][name]['type'] = ctype
+		if name not in self.__node_ids:
+			self.__node_ids[name] = len(self.__node_names)
+			self.__node_names.append(name)
+			self.__node_kinds.append(ctype)
 		else:
-			logger.warn('add cell: the cell {} ({}) is already exists'.
-				format(name, ctype))
+			hot('add cell: duplicate cells',
+				'add cell: the cell {} ({}) is already exists', name, ctype)
 
 	def __add_wire(self, source, to):
-		name = '{}-{}'.format(source, to)
-		if name not in self.__redundant_circuit['wires']:
-			self.__redundant_circuit['wires'][name] = {}
-			self.__redundant_circuit['wires'][name]['from'] = source
-			self.__redundant_circuit['wires'][name]['to'] = to
+		for n in (source, to):
+			if n not in self.__node_ids:
+				# A wire without a driving or reading cell, it is reported as
+				# an unknown type once the graph for a labeling is built.
+				self.__add_cell(n, 'wire')
+		edge = (self.__node_ids[source], self.__node_ids[to])
+		if edge not in self.__edge_set:
+			self.__edge_set.add(edge)
+			self.__edges.append(edge)
 		else:
-			logger.warn('add wire: the wire {} is alreadey exists'.format(name))
+			hot('add wire: duplicate wires',
+				'add wire: the wire {}-{} is alreadey exists', source, to)
+
+	def __construct_redundant_graph(self):
+		connected = [False] * len(self.__node_names)
+		for e in self.__edges:
+			connected[e[0]] = connected[e[1]] = True
+		isolated_nodes = [n for n, c in zip(self.__node_names, connected) if not c]
+		logger.warning('remove isolates: {}'.format(isolated_nodes))
+		ids = [0] * len(self.__node_names)
+		names = []
+		kinds = []
+		for i, c in enumerate(connected):
+			if c:
+				ids[i] = len(names)
+				names.append(self.__node_names[i])
+				kinds.append(self.__node_kinds[i])
+		self.__redundant_graph = CompactGraph(names, kinds,
+			[(ids[e[0]], ids[e[1]]) for e in self.__edges])
+		del self.__node_ids, self.__node_names, self.__node_kinds, self.__edges, self.__edge_set
 
 	def __construct_graph(self):
-		self.__redundant_graph.clear()
-		self.__graph.clear()
-
-		for c in self.__redundant_circuit['cells']:
-			ctype = self.__redundant_circuit['cells'][c]['type']
-			self.__redundant_graph.add_node(c, node_type=ctype)
-
-		for w in self.__redundant_circuit['wires']:
-			self.__redundant_graph.add_edge(
-				self.__redundant_circuit['wires'][w]['from'],
-				self.__redundant_circuit['wires'][w]['to'])
-
-		isolated_nodes = nx.isolates(self.__redundant_graph)
-		logger.warn('remove isolates: {}'.format(isolated_nodes))
-		self.__redundant_graph.remove_nodes_from(isolated_nodes)
-
-		for n in self.__redundant_graph.nodes():
-			node_type = self.__redundant_circuit['cells'][n]['type']
-			if node_type == 'port':
-				if 'y_' not in self.__labeling[str(n)][0]:
-					self.__circuit['cells'][n] = {}
-					self.__circuit['cells'][n]['type'] = node_type
-					self.__graph.add_node(n)
-					self.__graph[n]['node_type'] = node_type
-				else:
-					logger.info('port add: skip node {}'.format(n))
-			elif node_type in ('and', 'xor', 'dff', 'dffsr'):
-				self.__circuit['cells'][n] = {}
-				self.__circuit['cells'][n]['type'] = node_type
-				self.__graph.add_node(n)
-				self.__graph[n]['node_type'] = node_type
-			elif node_type == 'or':
-				self.__circuit['cells'][n] = {}
-				self.__circuit['cells'][n]['type'] = 'and'
-				self.__graph.add_node(n)
-				self.__graph[n]['node_type'] = node_type
-			elif node_type == 'mux':
-				self.__circuit['cells'][n] = {}
-				self.__circuit['cells'][n]['type'] = 'mux'
-				self.__graph.add_node(n, node_type=node_type)
-			elif node_type == 'const':
-				pass
-			elif node_type == 'not':
+		redundant = self.__redundant_graph
+		ids = {}
+		names = []
+		kinds = []
+		for n in redundant.nodes():
+			node_type = redundant.node_type(n)
+			if node_type == 'port' and any(l.startswith('y_') for l in self.__labeling[str(n)]):
+				hot('port add: skipped nodes', 'port add: skip node {}', n, level=INFO)
+			elif node_type in ('port', 'and', 'xor', 'dff', 'dffsr', 'or', 'mux'):
+				ids[n] = len(names)
+				names.append(n)
+				kinds.append(node_type)
+			elif node_type in ('const', 'not'):
 				pass
 			else:
 				logger.error('unknown type {} of the node {}'.format(node_type, n))
 				exit()
-		for n in self.__redundant_graph.nodes():
-			node_type = self.__redundant_circuit['cells'][n]['type']
-			if node_type == 'not':
-				for p in self.__redundant_graph.predecessors(n):
-					for o in self.__redundant_graph.successors(n):
-						if p in self.__circuit['cells'] and o in self.__circuit['cells']:
-							self.__graph.add_edge(p, o)
-
-		for e in self.__redundant_graph.edges():
-			if e[0] in self.__graph.nodes() and e[1] in self.__graph.nodes():
-				self.__graph.add_edge(*e)
 
-		for n in self.__graph.nodes():
-			s = len(self.__graph.successors(n))
-			p = len(self.__graph.predecessors(n))
+		edges = []
+		edge_set = set()
+		def add_edge(p, o):
+			if p in ids and o in ids and (ids[p], ids[o]) not in edge_set:
+				edge_set.add((ids[p], ids[o]))
+				edges.append((ids[p], ids[o]))
+		for n in redundant.nodes():
+			if redundant.node_type(n) == 'not':
+				for p in redundant.predecessors(n):
+					for o in redundant.successors(n):
+						add_edge(p, o)
+		for e in redundant.edges():
+			add_edge(*e)
+		self.__graph = CompactGraph(names, kinds, edges)
+
+		for i in range(len(self.__graph)):
+			s = len(self.__graph.successor_ids(i))
+			p = len(self.__graph.predecessor_ids(i))
 			if s == 0 and p == 0:
-				logger.warn('Construct graph: node {} is not connected'.format(n))
-			t = self.__circuit['cells'][n]
-			if t in ('and', 'xor') and (s < 1 or p != 2):
-				logger.warn(
-					'Construct graph: node {} is suspicious: predecessors = {}, successors = {}'.
-					format(n, p, s))
+				hot('Construct graph: unconnected nodes',
+					'Construct graph: node {} is not connected', self.__graph.name(i))
+			if self.__graph.kind(i) in ('and', 'or', 'xor') and (s < 1 or p != 2):
+				hot('Construct graph: suspicious nodes',
+					'Construct graph: node {} is suspicious: predecessors = {}, successors = {}',
+					self.__graph.name(i), p, s)
+		flush_hot()
 
 	def write_graph(self, graph=None, fname=None):
 		if graph == None:
 			graph = self.__graph
 		dot = 'strict digraph  {\n'
 		for e in graph.edges():
-			if e[1] != 'node_type':
-				i, o = str(e[0]), str(e[1])
-				dot += '{} -> {};\n'.format(i, o)
+			i, o = str(e[0]), str(e[1])
+			dot += '{} -> {};\n'.format(i, o)
 		dot += '}\n'
 		with open(fname if fname else 'tmp/graph.dot', 'w') as filename:
 			filename.write(dot)
 
 	def get_all_predecessors(self, node):
-		predecessors = []
-		for p in self.__graph.predecessors(node):
-			predecessors.append(p)
-			predecessors += self.get_all_predecessors(p)
-		return set(predecessors)
+		return self.__graph.fan_in(node)
 
 	def get_all_successors(self, node):
-		successors = []
-		for p in self.__graph.successors(node):
-			if p != 'node_type':
-				successors.append(p)
-				successors += self.get_all_successors(p)
-		return set(successors)
+		return self.__graph.fan_out(node)
 
 	def get_graph(self):
 		return self.__graph
 
+	def get_digest(self):
+		return self.__redundant_graph.digest()
+
+	def get_changed_cone(self, previous):
+		# A node changed if it is new or its type or inputs differ from the
+		# previous netlist, everything it feeds into may behave differently.
+		graph = self.__graph
+		old = previous.get_graph()
+		changed = 0
+		for i in range(len(graph)):
+			n = graph.name(i)
+			if n not in old or graph.kind(i) != old.node_type(n) or \
+				graph.predecessors(n) != old.predecessors(n):
+				changed |= 1 << i
+		cone = changed
+		for i in graph.ids_of(changed):
+			cone |= graph.fan_out_ids(i)
+		logger.info('Changed cone: {} changed nodes, {} of {} nodes in their fan-out'.
+			format(len(graph.ids_of(changed)), len(graph.ids_of(cone)), len(graph)))
+		return set(graph.names_of(cone))
+
 	def get_redundant_graph(self):
 		return self.__redundant_graph
 
 	def get_circuit(self):
-		return self.__circuit
+		circuit = {}
+		circuit['cells'] = {}
+		for n in self.__graph.nodes():
+			node_type = self.__graph.node_type(n)
+			circuit['cells'][n] = {}
+			circuit['cells'][n]['type'] = 'and' if node_type == 'or' else node_type
+		return circuit
 
 	def get_outputs(self):
 		outputs = []
-		trash = set(['node_type'])
-		for n in self.__graph.nodes():
-			if n != 'node_type':
-				if len(set(self.__graph.successors(n)) - trash) == 0:
-					outputs += [n]
+		for i in range(len(self.__graph)):
+			if len(self.__graph.successor_ids(i)) == 0:
+				outputs += [self.__graph.name(i)]
 		return outputs
 
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from array import array
+from hashlib import sha256
+
+KINDS = ('port', 'and', 'or', 'xor', 'xnor', 'not', 'dff', 'dffsr', 'mux', 'const')
+
+class CompactGraph(object):
+
+	def __init__(self, names, kinds, edges):
+		# Node i is names[i] with the type kinds[i], edges are pairs of node
+		# indices. Neighbours keep the order in which the edges are given.
+		self.__names = list(names)
+		self.__ids = dict((n, i) for i, n in enumerate(self.__names))
+		self.__kind_names = list(KINDS)
+		kind_ids = dict((k, i) for i, k in enumerate(self.__kind_names))
+		self.__kinds = array('B')
+		for k in kinds:
+			if k not in kind_ids:
+				kind_ids[k] = len(self.__kind_names)
+				self.__kind_names.append(k)
+			self.__kinds.append(kind_ids[k])
+		self.__succ_offsets, self.__succ = self.__csr(edges, 0, 1)
+		self.__pred_offsets, self.__pred = self.__csr(edges, 1, 0)
+		self.__fan_in = None
+		self.__fan_out = None
+		self.__digest = None
+
+	def __csr(self, edges, key, value):
+		n = len(self.__names)
+		offsets = array('l', [0]) * (n + 1)
+		for e in edges:
+			offsets[e[key] + 1] += 1
+		for i in range(n):
+			offsets[i + 1] += offsets[i]
+		fill = offsets[:-1]
+		targets = array('l', [0]) * len(edges)
+		for e in edges:
+			targets[fill[e[key]]] = e[value]
+			fill[e[key]] += 1
+		return offsets, targets
+
+	def __len__(self):
+		return len(self.__names)
+
+	def __contains__(self, node):
+		return node in self.__ids
+
+	def index(self, node):
+		return self.__ids[node]
+
+	def name(self, i):
+		return self.__names[i]
+
+	def nodes(self):
+		return list(self.__names)
+
+	def edges(self):
+		return [(self.__names[i], self.__names[j])
+			for i in range(len(self.__names)) for j in self.successor_ids(i)]
+
+	def number_of_edges(self):
+		return len(self.__succ)
+
+	def kind(self, i):
+		return self.__kind_names[self.__kinds[i]]
+
+	def node_type(self, node):
+		return self.kind(self.__ids[node])
+
+	def successor_ids(self, i):
+		return self.__succ[self.__succ_offsets[i]:self.__succ_offsets[i + 1]]
+
+	def predecessor_ids(self, i):
+		return self.__pred[self.__pred_offsets[i]:self.__pred_offsets[i + 1]]
+
+	def successors(self, node):
+		return [self.__names[j] for j in self.successor_ids(self.__ids[node])]
+
+	def predecessors(self, node):
+		return [self.__names[j] for j in self.predecessor_ids(self.__ids[node])]
+
+	def topological_ids(self):
+		# Kahn's algorithm, nodes on a cycle (loops through registers) are
+		# appended in index order after all acyclic ones.
+		n = len(self.__names)
+		in_degree = array('l', (self.__pred_offsets[i + 1] - self.__pred_offsets[i] for i in range(n)))
+		order = [i for i in range(n) if in_degree[i] == 0]
+		k = 0
+		while k < len(order):
+			for j in self.successor_ids(order[k]):
+				in_degree[j] -= 1
+				if in_degree[j] == 0:
+					order.append(j)
+			k += 1
+		cyclic = len(order) != n
+		if cyclic:
+			ordered = set(order)
+			order += [i for i in range(n) if i not in ordered]
+		return order, cyclic
+
+	def topological_order(self):
+		order, cyclic = self.topological_ids()
+		return [self.__names[i] for i in order], cyclic
+
+	def __closure(self, neighbour_ids, order, cyclic):
+		# closure[i] has a bit for every node reachable from i over the
+		# neighbour relation. Neighbours come first in the order, so one pass
+		# suffices unless there are loops through registers.
+		closure = [0] * len(self.__names)
+		changed = True
+		while changed:
+			changed = False
+			for i in order:
+				bits = closure[i]
+				for j in neighbour_ids(i):
+					bits |= closure[j] | (1 << j)
+				if bits != closure[i]:
+					closure[i] = bits
+					changed = cyclic
+		return closure
+
+	def digest(self):
+		# Node names, types and edges in id order, the same netlist parsed
+		# again gives the same digest whatever the JSON formatting was.
+		if self.__digest is None:
+			digest = sha256()
+			digest.update('\0'.join(str(n) for n in self.__names).encode())
+			digest.update('\0'.join(self.kind(i) for i in range(len(self.__names))).encode())
+			digest.update(self.__succ_offsets.tobytes())
+			digest.update(self.__succ.tobytes())
+			self.__digest = digest.hexdigest()
+		return self.__digest
+
+	def fan_in_ids(self, i):
+		if self.__fan_in is None:
+			order, cyclic = self.topological_ids()
+			self.__fan_in = self.__closure(self.predecessor_ids, order, cyclic)
+		return self.__fan_in[i]
+
+	def fan_out_ids(self, i):
+		if self.__fan_out is None:
+			order, cyclic = self.topological_ids()
+			self.__fan_out = self.__closure(self.successor_ids, order[::-1], cyclic)
+		return self.__fan_out[i]
+
+	def bits(self, nodes):
+		res = 0
+		for n in nodes:
+			res |= 1 << self.__ids[n]
+		return res
+
+	def ids_of(self, bits):
+		return [i for i, b in enumerate(reversed(bin(bits)[2:])) if b == '1']
+
+	def names_of(self, bits):
+		return [self.__names[i] for i in self.ids_of(bits)]
+
+	def fan_in(self, node):
+		return set(self.names_of(self.fan_in_ids(self.__ids[node])))
+
+	def fan_out(self, node):
+		return set(self.names_of(self.fan_out_ids(self.__ids[node])))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from hashlib import sha256
+from json import dump, dumps, load
+from os import makedirs, path, replace
+from CircuitGraph import CircuitGraph
+from PiniChecker import PiniChecker
+from ResultCache import RESULT_CACHE_VERSION
+from Z3Checker import Z3Checker
+from helpers import generate_pini_labeling, get_gadget_labeling_file, get_gadget_modules, get_shares
+from logger import logger
+
+class CompositionalChecker(object):
+
+	def __init__(self, json_file, labelings, order, mode='transient', gadget_labelings={},
+		options={}, cache_dir='tmp/cache/gadgets'):
+		self.__labelings = labelings
+		self.__order = order
+		self.__mode = mode
+		self.__options = options
+		self.__cache_dir = cache_dir
+		with open(json_file, 'r') as filename:
+			self.__netlist = load(filename)
+		self.__top_module = self.__netlist['top_module']
+		self.__gadgets = get_gadget_modules(self.__netlist)
+		self.__gadget_labelings = {}
+		for module in self.__gadgets:
+			labeling = gadget_labelings.get(module,
+				get_gadget_labeling_file(json_file[:-len('.json')], module))
+			if not path.exists(labeling):
+				logger.error('Compositional: there is no labeling {} for the gadget {}'.
+					format(labeling, module))
+				exit(-1)
+			self.__gadget_labelings[module] = labeling
+		self.__glue_names = {}
+
+	def __structural_hash(self, module, labeling, domains):
+		# Cell names and attributes do not change the verdict, so structurally
+		# identical gadgets share one entry whatever they are called. Verdicts
+		# of another checker version are not found.
+		module_json = self.__netlist['modules'][module]
+		cells = sorted(dumps(dict((k, c[k]) for k in c if k not in ('attributes', 'hide_name')),
+			sort_keys=True) for c in module_json['cells'].values())
+		ports = dumps(module_json['ports'], sort_keys=True)
+		digest = sha256()
+		for part in cells + [ports, dumps(labeling, sort_keys=True), dumps(domains, sort_keys=True),
+			str(self.__order), self.__mode, 'pini', str(RESULT_CACHE_VERSION)]:
+			digest.update(part.encode())
+			digest.update(b'\0')
+		return digest.hexdigest()
+
+	def __check_gadget(self, module):
+		module_json = self.__netlist['modules'][module]
+		for c in module_json['cells'].values():
+			if c['type'] in self.__netlist['modules']:
+				logger.error('Compositional: the gadget {} instantiates the module {}, nested gadgets are not supported'.
+					format(module, c['type']))
+				exit(-1)
+		ports = module_json['ports']
+		outputs = [str(b) for p in ports if ports[p]['direction'] == 'output' for b in ports[p]['bits']]
+		labeling, indices = generate_pini_labeling(self.__gadget_labelings[module], outputs)
+		domains = self.__share_domains(module)[0]
+		cache_file = path.join(self.__cache_dir, '{}.json'.format(
+			self.__structural_hash(module, labeling, domains)))
+		if path.exists(cache_file):
+			with open(cache_file, 'r') as filename:
+				res = load(filename)
+			logger.info('Compositional: gadget {} is {} (cached verdict of {})'.format(
+				module, 'PINI' if res['secure'] else 'not PINI', res['module']))
+			return res['secure'], res['gates']
+		circuit = CircuitGraph(labeling, json_object={'top_module': module,
+			'modules': {module: module_json}})
+		checker = PiniChecker(circuit.get_graph(), labeling, self.__order, indices,
+			self.__output_shares(module, circuit), self.__mode,
+			**dict((k, self.__options[k]) for k in ('encoding', 'cardinality') if k in self.__options))
+		check_res, gates = checker.check()
+		if check_res is None:
+			logger.warning('Compositional: gadget {} is unknown'.format(module))
+			return check_res, gates
+		logger.info('Compositional: gadget {} is {}'.format(
+			module, 'PINI' if check_res else 'not PINI'))
+		makedirs(self.__cache_dir, exist_ok=True)
+		with open(cache_file + '.part', 'w') as filename:
+			dump({'module': module, 'secure': check_res, 'gates': gates}, filename)
+		replace(cache_file + '.part', cache_file)
+		return check_res, gates
+
+	def __output_shares(self, module, circuit):
+		# An output bit labeled as share is observed at the node driving it,
+		# the other outputs are not observed.
+		domains = self.__share_domains(module)[0]
+		graph = circuit.get_graph()
+		redundant = circuit.get_redundant_graph()
+		outputs = {}
+		ports = self.__netlist['modules'][module]['ports']
+		for p in ports:
+			if ports[p]['direction'] != 'output':
+				continue
+			for b in ports[p]['bits']:
+				if type(b) != int or str(b) not in domains:
+					continue
+				node = b
+				# Not gates and the port itself are not part of the graph.
+				while node == b or node not in graph:
+					pred = redundant.predecessors(node)
+					if len(pred) != 1:
+						node = None
+						break
+					node = pred[0]
+				if node is not None:
+					outputs.setdefault(domains[str(b)], []).append(node)
+		return outputs
+
+	def __share_domains(self, module):
+		# The i-th bit of a share group in the gadget labeling is share i, for
+		# the inputs as for the outputs.
+		domains = {}
+		shares = get_shares(self.__gadget_labelings[module])
+		for group in shares.values():
+			for i, b in enumerate(group):
+				domains[b] = i
+		return domains, max([len(g) for g in shares.values()] + [1])
+
+	def __glue_module(self):
+		# Every gadget instance is replaced by one node per output bit that
+		# combines the instance inputs of the same share domain as the output
+		# share. Mixing share domains in the glue logic then shows up as a
+		# leak.
+		top = self.__netlist['modules'][self.__top_module]
+		cells = {}
+		bits = [b for c in top['cells'].values() for bs in c['connections'].values() for b in bs] + \
+			[b for p in top['ports'].values() for b in p['bits']]
+		fresh = max([b for b in bits if type(b) == int] + [1]) + 1
+		domains = dict((m, self.__share_domains(m)) for m in self.__gadgets)
+		ind = 1
+		for c in top['cells']:
+			cell = top['cells'][c]
+			if cell['type'] not in self.__gadgets:
+				cells[c] = cell
+				continue
+			ports = self.__netlist['modules'][cell['type']]['ports']
+			gadget_domains, shares = domains[cell['type']]
+			inputs = [[] for i in range(shares)]
+			for p in ports:
+				if ports[p]['direction'] != 'input':
+					continue
+				for b, top_bit in zip(ports[p]['bits'], cell['connections'][p]):
+					if str(b) in gadget_domains and type(top_bit) == int:
+						inputs[gadget_domains[str(b)]].append(top_bit)
+			for p in ports:
+				if ports[p]['direction'] != 'output':
+					continue
+				for i, (b, top_bit) in enumerate(zip(ports[p]['bits'], cell['connections'][p])):
+					if type(top_bit) != int:
+						continue
+					if str(b) not in gadget_domains:
+						logger.error('Compositional: the output {}[{}] of the gadget {} is no share in its labeling'.
+							format(p, i, cell['type']))
+						exit(-1)
+					domain = inputs[gadget_domains[str(b)]]
+					if not domain:
+						logger.error('Compositional: the output {}[{}] of the instance {} has no share inputs'.
+							format(p, i, c))
+						exit(-1)
+					if len(domain) == 1:
+						# A not gate is a plain wire for the labels.
+						cells['$glue$glue{}'.format(ind)] = {'type': '$_NOT_',
+							'port_directions': {'A': 'input', 'Y': 'output'},
+							'connections': {'A': domain, 'Y': [top_bit]}}
+						ind += 1
+						continue
+					acc = domain[0]
+					for k, b in enumerate(domain[1:]):
+						if k == len(domain) - 2:
+							out = top_bit
+						else:
+							out = fresh
+							fresh += 1
+						cells['$glue$glue{}'.format(ind)] = {'type': '$_AND_',
+							'port_directions': {'A': 'input', 'B': 'input', 'Y': 'output'},
+							'connections': {'A': [acc], 'B': [b], 'Y': [out]}}
+						self.__glue_names['and_glue{}'.format(ind)] = '{}:{}[{}]'.format(c, p, i)
+						ind += 1
+						acc = out
+		return {'ports': top['ports'], 'cells': cells, 'netnames': {}}
+
+	def check(self):
+		# An unknown gadget or labeling only decides the result if nothing
+		# else leaks.
+		res = (True, [])
+		for module in self.__gadgets:
+			check_res, gates = self.__check_gadget(module)
+			if check_res is None:
+				res = (check_res, gates)
+			elif not check_res:
+				return (check_res, ['{}.{}'.format(module, g) for g in gates])
+		glue = {'top_module': self.__top_module,
+			'modules': {self.__top_module: self.__glue_module()}}
+		circuit = None
+		for labeling in self.__labelings:
+			if circuit is None:
+				circuit = CircuitGraph(labeling, json_object=glue)
+			else:
+				circuit.set_labeling(labeling)
+			checker = Z3Checker(circuit.get_graph(), labeling, self.__order, self.__mode,
+				**self.__options)
+			check_res, gates = checker.check()
+			if check_res is None:
+				logger.warning('Compositional: glue logic of {} is unknown'.format(self.__top_module))
+				res = (check_res, gates)
+				continue
+			logger.info('Compositional: glue logic of {} is {}'.format(
+				self.__top_module, 'secure' if check_res else 'insecure'))
+			if not check_res:
+				return (check_res, [self.__glue_names.get(g, g) for g in gates])
+		return res
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import OrderedDict
+from gc import collect
+from json import dumps, loads
+from os import path, remove, stat, sysconf
+from resource import getrusage, RUSAGE_SELF
+from socket import socket, AF_UNIX, SOCK_STREAM
+from time import perf_counter
+from CircuitGraph import CircuitGraph
+from IndepChecker import IndepChecker
+from ResultCache import ResultCache
+from Z3Checker import Z3Checker
+from helpers import generate_labeling, get_shares, is_int
+from logger import logger
+
+MODES = {'s': 'stable', 't': 'transient', 'b': 'both'}
+
+class Daemon(object):
+
+	def __init__(self, socket_file='tmp/rebecca.sock', options={}, results=None, max_memory=1024):
+		self.__socket_file = socket_file
+		self.__options = options
+		self.__results = results
+		self.__max_memory = max_memory << 20
+		# Least recently used entries come first, parsed netlists are keyed by
+		# their file name and built encodings by everything they depend on.
+		self.__circuits = OrderedDict()
+		self.__checkers = OrderedDict()
+		self.__running = False
+
+	def serve(self):
+		if path.exists(self.__socket_file):
+			remove(self.__socket_file)
+		server = socket(AF_UNIX, SOCK_STREAM)
+		server.bind(self.__socket_file)
+		server.listen()
+		logger.info('Daemon: listening on {}'.format(self.__socket_file))
+		self.__running = True
+		try:
+			while self.__running:
+				conn, addr = server.accept()
+				# Jobs are run one after the other, Z3 is not thread safe.
+				with conn, conn.makefile('rw') as stream:
+					try:
+						for line in stream:
+							if line.strip():
+								self.__handle(line, stream)
+							if not self.__running:
+								break
+					except ConnectionError as e:
+						logger.warning('Daemon: the client went away: {}'.format(e))
+		finally:
+			server.close()
+			remove(self.__socket_file)
+			logger.info('Daemon: stopped')
+
+	def __send(self, stream, record):
+		stream.write(dumps(record) + '\n')
+		stream.flush()
+
+	def __handle(self, line, stream):
+		try:
+			job = loads(line)
+			if job.get('shutdown'):
+				self.__running = False
+				res = 'shutdown'
+			elif 'check' in job:
+				res = self.__check(*job['check'], job.get('options', {}), stream)
+			elif 'independence_check' in job:
+				res = self.__independence_check(*job['independence_check'], job.get('options', {}))
+			else:
+				raise ValueError('unknown job {}'.format(line.strip()))
+			self.__send(stream, {'result': res})
+		except SystemExit:
+			self.__send(stream, {'error': 'the job was aborted, see the log'})
+		except ConnectionError:
+			raise
+		except Exception as e:
+			logger.error('Daemon: job {} failed: {}'.format(line.strip(), e))
+			self.__send(stream, {'error': str(e)})
+
+	def __memory(self):
+		# Current resident set size in bytes, the peak one if it is unknown.
+		try:
+			with open('/proc/self/statm', 'r') as filename:
+				return int(filename.read().split()[1]) * sysconf('SC_PAGE_SIZE')
+		except OSError:
+			return getrusage(RUSAGE_SELF).ru_maxrss << 10
+
+	def __evict(self):
+		# Encodings go first, the netlist of the running job always stays.
+		while (self.__checkers or len(self.__circuits) > 1) and self.__memory() > self.__max_memory:
+			if self.__checkers:
+				key = self.__checkers.popitem(last=False)[0]
+				logger.info('Daemon: evicted the encoding of {}'.format(key[0]))
+			else:
+				netlist = self.__circuits.popitem(last=False)[0]
+				logger.info('Daemon: evicted the netlist {}'.format(netlist))
+			collect()
+
+	def __circuit(self, netlist):
+		st = stat(netlist)
+		stamp = (st.st_mtime_ns, st.st_size)
+		if netlist in self.__circuits and self.__circuits[netlist][0] == stamp:
+			self.__circuits.move_to_end(netlist)
+		else:
+			self.__circuits[netlist] = (stamp, CircuitGraph.load(netlist))
+			self.__evict()
+		return self.__circuits[netlist]
+
+	def __checker(self, netlist, labeling, order, mode, options):
+		stamp, circuit = self.__circuit(netlist)
+		key = (netlist, stamp, dumps(labeling, sort_keys=True), order, mode,
+			dumps(options, sort_keys=True))
+		if key in self.__checkers:
+			self.__checkers.move_to_end(key)
+			return self.__checkers[key]
+		circuit.set_labeling(labeling)
+		checker = Z3Checker(circuit.get_graph(), labeling, order, mode, **options)
+		self.__checkers[key] = checker
+		self.__evict()
+		return checker
+
+	def __design(self, netlist, order, labeling, mode=None):
+		if not netlist.endswith('.json'):
+			raise ValueError('the parsed netlist {} does not have .json ending'.format(netlist))
+		if not labeling.endswith('.txt'):
+			raise ValueError('the labeling {} does not have .txt ending'.format(labeling))
+		if not is_int(str(order)):
+			raise ValueError('order should be int')
+		if mode is not None and mode not in MODES:
+			raise ValueError('mode should be either s, t or b')
+		return int(order), MODES.get(mode)
+
+	def __check(self, netlist, order, labeling, mode, options, stream):
+		order, mode = self.__design(netlist, order, labeling, mode)
+		options = {**self.__options, **options}
+		res = [True, []]
+		for labels in generate_labeling(labeling):
+			secrets = ', '.join(
+				[var for k in labels for var in labels[k] if 's_' in var])
+			time_start_abs = perf_counter()
+			key = None
+			cached = None
+			if self.__results is not None:
+				key = ResultCache.key(self.__circuit(netlist)[1].get_digest(), labels, order, mode)
+				cached = self.__results.get(key)
+			if cached is None:
+				check_res, gates = self.__checker(netlist, labels, order, mode, options).check()
+				if key and check_res is not None:
+					self.__results.put(key, check_res, gates, perf_counter() - time_start_abs)
+			else:
+				check_res, gates = cached[:2]
+			logger.info('Daemon: result of {} ({}): {}, {}'.format(netlist, secrets, check_res, gates))
+			self.__send(stream, {'secrets': secrets, 'verdict': check_res, 'gates': gates,
+				'cached': cached is not None, 'seconds': round(perf_counter() - time_start_abs, 4)})
+			if check_res is None:
+				res = [check_res, gates]
+			elif not check_res:
+				return [check_res, gates]
+		return res
+
+	def __independence_check(self, netlist, order, labeling, options):
+		order, mode = self.__design(netlist, order, labeling)
+		options = dict((k, v) for k, v in {**self.__options, **options}.items()
+			if k in ('encoding', 'cardinality'))
+		labels = generate_labeling(labeling)[0]
+		circuit = self.__circuit(netlist)[1]
+		circuit.set_labeling(labels)
+		checker = IndepChecker(circuit.get_graph(), labels, order, get_shares(labeling),
+			circuit.get_outputs(), **options)
+		return checker.check()
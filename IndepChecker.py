@@ -5,12 +5,13 @@
 
 from CircuitGraph import CircuitGraph
 from z3 import *
+from LabelEncoding import LabelEncoding
 from json import dump, load, dumps
 from logger import logger
 
 class IndepChecker(object):
 
-	def __init__(self, circuit, labels, order, shares, outputs):
+	def __init__(self, circuit, labels, order, shares, outputs, encoding='bool', cardinality='sum'):
 		self.__circuit = circuit
 		self.__labels = labels
 		self.__order = order
@@ -18,12 +19,14 @@ class IndepChecker(object):
 		self.__shares = shares
 		self.__mode = 'transient'
 		self.__check_security = True
+		self.__encoding = encoding
+		self.__enc = LabelEncoding(encoding, cardinality)
 		self.__checker_init()
 		self.__process_circuit()
 
 	def __process_circuit(self):
 		for node in self.__circuit.nodes():
-			node_type = self.__circuit[node]['node_type']
+			node_type = self.__circuit.node_type(node)
 			if node_type == 'port':
 				self.__process_port_gate(node)
 			elif node_type in ('xor', 'xnor'):
@@ -42,19 +45,19 @@ class IndepChecker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 2:
 			in1, in2 = pred
-			self.__s.add(self.__z3_xor(self.__variables_stable[in1],
+			self.__s.add(self.__enc.xor(self.__variables_stable[in1],
 				self.__variables_stable[in2],
 				self.__variables_stable[gate]))
 			if self.__mode == 'transient':
-				self.__s.add(Or(self.__z3_empty(self.__variables_transient[gate]),
-				self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]),
-				self.__z3_copy(self.__variables_transient[in2], self.__variables_transient[gate]),
-				self.__z3_xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
+				self.__s.add(Or(self.__enc.empty(self.__variables_transient[gate]),
+				self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]),
+				self.__enc.copy(self.__variables_transient[in2], self.__variables_transient[gate]),
+				self.__enc.xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
 		elif len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
 			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one or two'.format(gate))
 			exit(-1)
@@ -63,20 +66,20 @@ class IndepChecker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 2:
 			in1, in2 = pred
-			self.__s.add(Or(self.__z3_empty(self.__variables_stable[gate]),
-				self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]),
-				self.__z3_copy(self.__variables_stable[in2], self.__variables_stable[gate]),
-				self.__z3_xor(self.__variables_stable[in1], self.__variables_stable[in2], self.__variables_stable[gate])))
+			self.__s.add(Or(self.__enc.empty(self.__variables_stable[gate]),
+				self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]),
+				self.__enc.copy(self.__variables_stable[in2], self.__variables_stable[gate]),
+				self.__enc.xor(self.__variables_stable[in1], self.__variables_stable[in2], self.__variables_stable[gate])))
 			if self.__mode == 'transient':
-				self.__s.add(Or(self.__z3_empty(self.__variables_transient[gate]),
-					self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]),
-					self.__z3_copy(self.__variables_transient[in2], self.__variables_transient[gate]),
-					self.__z3_xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
+				self.__s.add(Or(self.__enc.empty(self.__variables_transient[gate]),
+					self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]),
+					self.__enc.copy(self.__variables_transient[in2], self.__variables_transient[gate]),
+					self.__enc.xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
 		elif len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
 			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one or two'.format(gate))
 			exit(-1)
@@ -85,47 +88,32 @@ class IndepChecker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
 			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one'.format(gate))
 			exit(-1)
 
 	def __process_port_gate(self, gate):
-		lst = []
-		neg_lst = []
-		for v in self.__variables_stable[gate]:
-			var = '_'.join(str(v).split('_')[:-2])
-			if var in self.__labels[str(gate)]:
-				lst.append(v)
-			else:
-				neg_lst.append(v)
-		self.__s.add(And(lst + [Not(v) for v in neg_lst]))
+		slots = [self.__slots[v] for v in self.__labels[str(gate)] if v in self.__slots]
+		self.__s.add(self.__enc.assign(self.__variables_stable[gate], slots))
 		if self.__mode == 'transient':
-			lst = []
-			neg_lst = []
-			for v in self.__variables_transient[gate]:
-				var = '_'.join(str(v).split('_')[:-2])
-				if var in self.__labels[str(gate)]:
-					lst.append(v)
-				else:
-					neg_lst.append(v)
-			self.__s.add(And(lst + [Not(v) for v in neg_lst]))
+			self.__s.add(self.__enc.assign(self.__variables_transient[gate], slots))
 
 	def __process_register_gate(self, gate):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
 			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_transient[gate]))
+				self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one'.format(gate))
 			exit(-1)
 
 	def __checker_init(self):
-		self.__s = Solver()
+		self.__s = self.__enc.new_solver()
 		secret_list = []
 		mask_list = []
 		unimportant_list = []
@@ -135,7 +123,7 @@ class IndepChecker(object):
 		variables_activation = {}
 
 		for node in self.__circuit.nodes():
-			if self.__circuit[node]['node_type'] == 'port':
+			if self.__circuit.node_type(node) == 'port':
 				for label in self.__labels[str(node)]:
 					variables += [label]
 					label_type = label.split('_')[0]
@@ -155,17 +143,22 @@ class IndepChecker(object):
 
 		self.__masks = mask_list
 		self.__secrtes = secret_list
+		self.__slots = {v: i for i, v in enumerate(variables)}
 
-		indep_activation_sums = {}
-		for share in self.__shares:
-			indep_activation_sums[share] = Int('share_activation_sum_{}'.format(share))
-		indep_activation_sums['output'] = Int('share_activation_sum_output')
-
+		# In the bit-vector encoding the i-th bit of a node's vector is the
+		# i-th label variable of the Boolean encoding.
+		self.__width = max(len(variables), 1)
 		for node in self.__circuit.nodes():
-			self.__variables_stable[node] = [Bool('{}_{}_stable'.format(v, node)) for v in variables]
+			if self.__encoding == 'bv':
+				self.__variables_stable[node] = BitVec('{}_stable'.format(node), self.__width)
+			else:
+				self.__variables_stable[node] = [Bool('{}_{}_stable'.format(v, node)) for v in variables]
 			variables_activation[node] = Bool('activation_{}'.format(node))
 			if self.__mode == 'transient':
-				self.__variables_transient[node] = [Bool('{}_{}_transient'.format(v, node)) for v in variables]
+				if self.__encoding == 'bv':
+					self.__variables_transient[node] = BitVec('{}_transient'.format(node), self.__width)
+				else:
+					self.__variables_transient[node] = [Bool('{}_{}_transient'.format(v, node)) for v in variables]
 
 		shares_acivation = {}
 		for share in self.__shares:
@@ -176,66 +169,43 @@ class IndepChecker(object):
 		for o in self.__outputs:
 			shares_acivation['output'][o] = Bool('activation_share_{}'.format(o))
 
-		for share in self.__shares:
-			indep_activation_sums[share] = Sum([If(shares_acivation[share][n], 1, 0) for n in self.__shares[share]])
-			self.__s.add(indep_activation_sums[share] <= self.__order)
-			self.__s.add(indep_activation_sums[share] >= 0)
-		indep_activation_sums['output'] = Sum([If(shares_acivation['output'][n], 1, 0) for n in shares_acivation['output']])
-		self.__s.add(indep_activation_sums['output'] <= self.__order)
-		self.__s.add(indep_activation_sums['output'] >= 0)
-
-		variables_checking_gate = {}
-		for var in variables:
-			variables_checking_gate[var] = Bool('{}_checking_gate'.format(var))
-			lst = []
+		for share in shares_acivation:
+			self.__s.add(self.__enc.at_most(self.__s, list(shares_acivation[share].values()), self.__order,
+				'share_{}'.format(share)))
+
+		if self.__encoding == 'bv':
+			checking_gate = BitVecVal(0, self.__width)
 			for share in shares_acivation:
 				for node in shares_acivation[share]:
-					try:
-						ind = [str(i) for i in self.__variables_transient[int(node)]].index('{}_{}_transient'.format(var, node))
-						lst += [And(shares_acivation[share][node], self.__variables_transient[int(node)][ind])]
-					except:
-						ind = [str(i) for i in self.__variables_transient[node]].index('{}_{}_transient'.format(var, node))
-						lst += [And(shares_acivation[share][node], self.__variables_transient[node][ind])]
-			variables_checking_gate[var] = self.__xor_list(lst)
-		checking_secrets = []
-		checking_masks = []
-		for var in variables_checking_gate:
-			v = '_'.join(str(var).split('_')[:2])
-			if v in secret_list:
-				checking_secrets += [variables_checking_gate[var]]
-			elif v in mask_list:
-				checking_masks += [variables_checking_gate[var]]
-		self.__s.add(And([Or(checking_secrets)] + [Not(v) for v in checking_masks]))
-
-	def __z3_xor(self, in1, in2, out):
-		lst = []
-		for i in range(len(in1)):
-			lst.append(out[i] == Xor(in1[i], in2[i]))
-		return And(lst)
-
-	def __xor_list(self, lst):
-		if len(lst) == 2:
-			return Xor(lst[0], lst[1])
-		else:
-			return Xor(lst[0], self.__xor_list(lst[1:]))
-
-	def __and_list(self, lst):
-		if len(lst) == 2:
-			return Xor(lst[0], lst[1])
+					n = int(node) if node not in self.__variables_transient else node
+					checking_gate = checking_gate ^ If(shares_acivation[share][node],
+						self.__variables_transient[n], BitVecVal(0, self.__width))
+			secrets = sum(1 << self.__slots[var] for var in secret_list)
+			masks = sum(1 << self.__slots[var] for var in mask_list)
+			self.__s.add(And(checking_gate & secrets != 0, checking_gate & masks == 0))
 		else:
-			return Xor(lst[0], self.__xor_list(lst[1:]))
-
-	def __z3_copy(self, inp, out):
-		lst = []
-		for i in range(len(inp)):
-			lst.append(out[i] == inp[i])
-		return And(lst)
-
-	def __z3_empty(self, out):
-		lst = []
-		for o in out:
-			lst.append(Not(o))
-		return And(lst)
+			variables_checking_gate = {}
+			for var in variables:
+				variables_checking_gate[var] = Bool('{}_checking_gate'.format(var))
+				lst = []
+				for share in shares_acivation:
+					for node in shares_acivation[share]:
+						try:
+							ind = [str(i) for i in self.__variables_transient[int(node)]].index('{}_{}_transient'.format(var, node))
+							lst += [And(shares_acivation[share][node], self.__variables_transient[int(node)][ind])]
+						except:
+							ind = [str(i) for i in self.__variables_transient[node]].index('{}_{}_transient'.format(var, node))
+							lst += [And(shares_acivation[share][node], self.__variables_transient[node][ind])]
+				variables_checking_gate[var] = self.__enc.xor_list(lst)
+			checking_secrets = []
+			checking_masks = []
+			for var in variables_checking_gate:
+				v = '_'.join(str(var).split('_')[:2])
+				if v in secret_list:
+					checking_secrets += [variables_checking_gate[var]]
+				elif v in mask_list:
+					checking_masks += [variables_checking_gate[var]]
+			self.__s.add(And([Or(checking_secrets)] + [Not(v) for v in checking_masks]))
 
 	def check(self):
 		r = self.__s.check()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from json import JSONDecoder, JSONDecodeError
+from re import compile
+
+DELIMITER = compile(r'[,:\]}\s]')
+
+class JsonStream(object):
+
+	def __init__(self, fp, chunk_size=1 << 20):
+		self.__fp = fp
+		self.__chunk_size = chunk_size
+		self.__decoder = JSONDecoder()
+		self.__buf = ''
+		self.__pos = 0
+		self.__eof = False
+
+	def __fill(self):
+		if self.__eof:
+			return False
+		chunk = self.__fp.read(self.__chunk_size)
+		if not chunk:
+			self.__eof = True
+			return False
+		# Drop what has already been consumed before growing the buffer.
+		self.__buf = self.__buf[self.__pos:] + chunk
+		self.__pos = 0
+		return True
+
+	def __peek(self):
+		while True:
+			while self.__pos < len(self.__buf) and self.__buf[self.__pos] in ' \t\n\r':
+				self.__pos += 1
+			if self.__pos < len(self.__buf):
+				return self.__buf[self.__pos]
+			if not self.__fill():
+				raise ValueError('unexpected end of JSON stream')
+
+	def __expect(self, ch):
+		if self.__peek() != ch:
+			raise ValueError('expected {} at JSON stream position {}, got {}'.
+				format(ch, self.__pos, self.__buf[self.__pos]))
+		self.__pos += 1
+
+	def read_value(self):
+		if self.__peek() not in '{["':
+			# Numbers and literals have no closing character, so the buffer has
+			# to reach past them before they can be decoded.
+			while not DELIMITER.search(self.__buf, self.__pos) and self.__fill():
+				pass
+		while True:
+			try:
+				value, self.__pos = self.__decoder.raw_decode(self.__buf, self.__pos)
+				return value
+			except JSONDecodeError:
+				if not self.__fill():
+					raise
+
+	def skip_value(self):
+		ch = self.__peek()
+		if ch == '{':
+			for key in self.iter_object():
+				self.skip_value()
+		elif ch == '[':
+			for i in self.iter_array():
+				self.skip_value()
+		else:
+			self.read_value()
+
+	def iter_object(self):
+		# Yields the keys of an object one by one, the caller has to consume
+		# the value of every key before asking for the next one.
+		self.__expect('{')
+		if self.__peek() == '}':
+			self.__pos += 1
+			return
+		while True:
+			key = self.read_value()
+			self.__expect(':')
+			yield key
+			if self.__peek() == ',':
+				self.__pos += 1
+			else:
+				self.__expect('}')
+				return
+
+	def iter_array(self):
+		self.__expect('[')
+		if self.__peek() == ']':
+			self.__pos += 1
+			return
+		i = 0
+		while True:
+			yield i
+			i += 1
+			if self.__peek() == ',':
+				self.__pos += 1
+			else:
+				self.__expect(']')
+				return
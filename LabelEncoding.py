@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from z3 import *
+
+class LabelEncoding(object):
+
+	def __init__(self, encoding='bool', cardinality='sum'):
+		# A label set is a list of Bools (bool) or one bit-vector (bv), the
+		# probe budget is an integer sum (sum), a pseudo-Boolean constraint
+		# (pb) or a sequential counter (seq).
+		self.__encoding = encoding
+		self.__cardinality = cardinality
+		self.__counters = {}
+
+	def new_solver(self):
+		# Z3 handles bit-vectors lazily in its default solver, which is
+		# orders of magnitude slower here than bit-blasting to SAT.
+		if self.__encoding == 'bv':
+			return OrElse(Then('simplify', 'lia2card', 'card2bv', 'bit-blast', 'sat'), 'smt').solver()
+		return Solver()
+
+	def at_most(self, s, lits, k, name):
+		if not lits:
+			return BoolVal(True)
+		elif self.__cardinality == 'pb':
+			return AtMost(*(lits + [k]))
+		elif self.__cardinality == 'seq':
+			counter = self.sequential_counter(s, lits, k + 1, name)
+			return Not(counter[k]) if k < len(counter) else BoolVal(True)
+		return Sum([If(l, 1, 0) for l in lits]) <= k
+
+	def at_least_one(self, lits):
+		if self.__cardinality == 'sum':
+			return Sum([If(l, 1, 0) for l in lits]) > 0
+		return Or(lits)
+
+	def sequential_counter(self, s, lits, bound, name):
+		# Sinz' sequential counter: counter[j] is implied as soon as at least
+		# j + 1 of the literals are true, counting stops at bound.
+		if name in self.__counters:
+			# A counter up to a larger bound also counts up to this one.
+			return self.__counters[name]
+		counter = []
+		for i, lit in enumerate(lits):
+			registers = [Bool('{}_counter_{}_{}'.format(name, i, j)) for j in range(min(i + 1, bound))]
+			for j in range(len(registers)):
+				if j == 0:
+					s.add(Implies(lit, registers[j]))
+				else:
+					s.add(Implies(And(lit, counter[j - 1]), registers[j]))
+				if j < len(counter):
+					s.add(Implies(counter[j], registers[j]))
+			counter = registers
+		self.__counters[name] = counter
+		return counter
+
+	def xor(self, in1, in2, out):
+		if self.__encoding == 'bv':
+			return out == in1 ^ in2
+		lst = []
+		for i in range(len(in1)):
+			lst.append(out[i] == Xor(in1[i], in2[i]))
+		return And(lst)
+
+	def xor_list(self, lst):
+		if len(lst) == 0:
+			return BoolVal(False)
+		elif len(lst) == 1:
+			return lst[0]
+		res = lst[-1]
+		for x in reversed(lst[:-1]):
+			res = Xor(x, res)
+		return res
+
+	def copy(self, inp, out):
+		if self.__encoding == 'bv':
+			return out == inp
+		lst = []
+		for i in range(len(inp)):
+			lst.append(out[i] == inp[i])
+		return And(lst)
+
+	def assign(self, out, slots):
+		if self.__encoding == 'bv':
+			return out == sum(1 << i for i in slots)
+		lst = []
+		for i in range(len(out)):
+			lst.append(out[i] if i in slots else Not(out[i]))
+		return And(lst)
+
+	def empty(self, out):
+		if self.__encoding == 'bv':
+			return out == 0
+		lst = []
+		for o in out:
+			lst.append(Not(o))
+		return And(lst)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from logger import logger
+
+class LabelPropagator(object):
+
+	def __init__(self, circuit, labels, order, mode='transient', limit=128):
+		self.__circuit = circuit
+		self.__labels = labels
+		self.__order = order
+		self.__mode = mode
+		self.__limit = limit
+		self.__stable = {}
+		self.__transient = {}
+		self.__propagator_init()
+		self.__propagate()
+
+	def __propagator_init(self):
+		# Every label gets one bit, a label combination is an int and the
+		# combinations a node can hold are a set of ints. None stands for
+		# "any combination" once a set grows beyond the limit.
+		variables = []
+		for node in self.__circuit.nodes():
+			if self.__circuit.node_type(node) == 'port':
+				for label in self.__labels[str(node)]:
+					if label.split('_')[0] in ('s', 'm'):
+						variables += [label]
+		self.__bits = dict((v, 1 << i) for i, v in enumerate(sorted(set(variables))))
+		self.__secrets = sum(self.__bits[v] for v in self.__bits if v.split('_')[0] == 's')
+		self.__masks = sum(self.__bits[v] for v in self.__bits if v.split('_')[0] == 'm')
+
+	def __propagate(self):
+		order, cyclic = self.__circuit.topological_order()
+		for node in order:
+			self.__stable[node] = set([0])
+			self.__transient[node] = set([0])
+		# A single pass suffices for an acyclic circuit, loops through
+		# registers are iterated until the sets do not grow anymore.
+		changed = True
+		while changed:
+			changed = False
+			for node in order:
+				stable, transient = self.__process_node(node)
+				if stable != self.__stable[node] or transient != self.__transient[node]:
+					self.__stable[node] = stable
+					self.__transient[node] = transient
+					changed = cyclic
+
+	def __process_node(self, node):
+		node_type = self.__circuit.node_type(node)
+		pred = self.__circuit.predecessors(node)
+		if node_type == 'port':
+			label = 0
+			for v in self.__labels[str(node)]:
+				label |= self.__bits.get(v, 0)
+			return set([label]), set([label])
+		elif node_type in ('dff', 'dffsr') and len(pred) == 1:
+			return self.__stable[pred[0]], self.__stable[pred[0]]
+		elif len(pred) == 1:
+			return self.__stable[pred[0]], self.__transient[pred[0]]
+		elif len(pred) == 2 and node_type in ('xor', 'xnor'):
+			in1, in2 = pred
+			return self.__xor(self.__stable[in1], self.__stable[in2]), \
+				self.__glitch(self.__transient[in1], self.__transient[in2])
+		elif len(pred) == 2 and node_type in ('or', 'and'):
+			in1, in2 = pred
+			return self.__glitch(self.__stable[in1], self.__stable[in2]), \
+				self.__glitch(self.__transient[in1], self.__transient[in2])
+		else:
+			logger.error('Unexpected node type {} with {} inputs for the node {}'.
+				format(node_type, len(pred), node))
+			exit(-1)
+
+	def __xor(self, in1, in2):
+		if in1 is None or in2 is None:
+			return None
+		res = set()
+		for a in in1:
+			for b in in2:
+				res.add(a ^ b)
+			if len(res) > self.__limit:
+				return None
+		return res
+
+	def __glitch(self, in1, in2):
+		res = self.__xor(in1, in2)
+		if res is None:
+			return None
+		res |= in1 | in2 | set([0])
+		return res if len(res) <= self.__limit else None
+
+	def __is_candidate(self, combinations):
+		if combinations is None:
+			return True
+		for c in combinations:
+			if self.__order == 1 and c & self.__secrets and not c & self.__masks:
+				return True
+			elif self.__order > 1 and c:
+				return True
+		return False
+
+	def get_candidates(self):
+		# A first-order probe has to reveal a secret unmasked on its own. At
+		# higher orders only nodes that can carry no label at all are
+		# excluded, since the masks of one probe may cancel another one.
+		probed = self.__stable if self.__mode == 'stable' else self.__transient
+		return set(node for node in probed if self.__is_candidate(probed[node]))
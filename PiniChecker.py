@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from z3 import *
+from LabelEncoding import LabelEncoding
+from logger import logger
+
+class PiniChecker(object):
+
+	def __init__(self, circuit, labels, order, indices, outputs, mode='transient', encoding='bool',
+		cardinality='sum'):
+		# indices maps the label of every input share to its share index and
+		# outputs maps every share index to the nodes driving the output
+		# shares of that index.
+		self.__circuit = circuit
+		self.__labels = labels
+		self.__order = order
+		self.__indices = indices
+		self.__outputs = outputs
+		self.__mode = mode
+		self.__encoding = encoding
+		self.__enc = LabelEncoding(encoding, cardinality)
+		self.__checker_init()
+
+	def __checker_init(self):
+		# The gadget is PINI if t1 internal probes and the output shares of
+		# the indices O, t1 + |O| <= order, only depend on the input shares of
+		# O and of at most t1 other indices. A leak is a choice of probes such
+		# that the mask-free label combinations reveal more than t1 indices
+		# outside O. t1 + 1 combinations are enough to show that, so the label
+		# propagation is encoded order + 1 times with independent choices of
+		# the gates and of the probes combined.
+		self.__s = self.__enc.new_solver()
+		variables = set()
+		for node in self.__circuit.nodes():
+			if self.__circuit.node_type(node) == 'port':
+				for label in self.__labels[str(node)]:
+					if label.split('_')[0] in ('s', 'm'):
+						variables.add(label)
+		variables = sorted(variables)
+		self.__slots = {v: i for i, v in enumerate(variables)}
+		self.__width = max(len(variables), 1)
+		shares = max(list(self.__indices.values()) + list(self.__outputs) + [0]) + 1
+
+		self.__probes = dict((node, Bool('probe_{}'.format(node))) for node in self.__circuit.nodes())
+		self.__observed = [Bool('output_{}'.format(i)) for i in range(shares)]
+		self.__s.add(self.__enc.at_most(self.__s, list(self.__probes.values()) + self.__observed,
+			self.__order, 'probe'))
+		revealed = [[] for i in range(shares)]
+		for c in range(self.__order + 1):
+			probed = self.__propagate(c)
+			selected = []
+			for node in self.__circuit.nodes():
+				select = Bool('select_{}_{}'.format(c, node))
+				self.__s.add(Implies(select, self.__probes[node]))
+				selected.append((select, probed[node]))
+			for i in self.__outputs:
+				for node in self.__outputs[i]:
+					select = Bool('select_{}_output_{}_{}'.format(c, i, node))
+					self.__s.add(Implies(select, self.__observed[i]))
+					selected.append((select, probed[node]))
+			if self.__encoding == 'bv':
+				combination = BitVecVal(0, self.__width)
+				for select, label in selected:
+					combination = combination ^ If(select, label, BitVecVal(0, self.__width))
+				combination = [Extract(i, i, combination) == 1 for i in range(len(variables))]
+			else:
+				combination = [self.__enc.xor_list([And(select, label[i]) for select, label in selected])
+					for i in range(len(variables))]
+			# A combination containing a fresh mask is uniform.
+			for v in variables:
+				if v.split('_')[0] == 'm':
+					self.__s.add(Not(combination[self.__slots[v]]))
+			for v in variables:
+				if v in self.__indices:
+					revealed[self.__indices[v]].append(combination[self.__slots[v]])
+		leaked = [And(Or(revealed[i]), Not(self.__observed[i])) for i in range(shares) if revealed[i]]
+		# More leaked indices than internal probes: for some k, at most k
+		# probes and at most len(leaked) - k - 1 indices not leaked. The bounds
+		# are built from the largest one down, a sequential counter is reused
+		# for the smaller ones.
+		probes = list(self.__probes.values())
+		at_most_probes = [self.__enc.at_most(self.__s, probes, k, 'internal')
+			for k in reversed(range(self.__order + 1))][::-1]
+		kept = [Not(l) for l in leaked]
+		self.__s.add(Or([And(at_most_probes[k], self.__enc.at_most(self.__s, kept, len(leaked) - k - 1, 'kept'))
+			for k in range(min(self.__order + 1, len(leaked)))]))
+
+	def __propagate(self, c):
+		# One copy of the label propagation, returns the labels seen by a
+		# probe: the glitch-extended ones in transient mode.
+		glitches = self.__mode != 'stable'
+		stable = {}
+		transient = {}
+		for node in self.__circuit.nodes():
+			if self.__encoding == 'bv':
+				stable[node] = BitVec('{}_{}_stable'.format(c, node), self.__width)
+				if glitches:
+					transient[node] = BitVec('{}_{}_transient'.format(c, node), self.__width)
+			else:
+				stable[node] = [Bool('{}_{}_{}_stable'.format(c, v, node)) for v in self.__slots]
+				if glitches:
+					transient[node] = [Bool('{}_{}_{}_transient'.format(c, v, node)) for v in self.__slots]
+		for node in self.__circuit.nodes():
+			node_type = self.__circuit.node_type(node)
+			pred = self.__circuit.predecessors(node)
+			if node_type == 'port':
+				slots = [self.__slots[v] for v in self.__labels[str(node)] if v in self.__slots]
+				self.__s.add(self.__enc.assign(stable[node], slots))
+				if glitches:
+					self.__s.add(self.__enc.assign(transient[node], slots))
+			elif node_type in ('dff', 'dffsr') and len(pred) == 1:
+				self.__s.add(self.__enc.copy(stable[pred[0]], stable[node]))
+				if glitches:
+					self.__s.add(self.__enc.copy(stable[pred[0]], transient[node]))
+			elif node_type in ('xor', 'xnor', 'or', 'and') and len(pred) == 1:
+				self.__s.add(self.__enc.copy(stable[pred[0]], stable[node]))
+				if glitches:
+					self.__s.add(self.__enc.copy(transient[pred[0]], transient[node]))
+			elif node_type in ('xor', 'xnor', 'or', 'and') and len(pred) == 2:
+				in1, in2 = pred
+				if node_type in ('xor', 'xnor'):
+					self.__s.add(self.__enc.xor(stable[in1], stable[in2], stable[node]))
+				else:
+					self.__s.add(self.__glitch(stable, in1, in2, node))
+				if glitches:
+					self.__s.add(self.__glitch(transient, in1, in2, node))
+			else:
+				logger.error('Unexpected node type {} with {} inputs for the node {}'.
+					format(node_type, len(pred), node))
+				exit(-1)
+		return transient if glitches else stable
+
+	def __glitch(self, variables, in1, in2, node):
+		return Or(self.__enc.empty(variables[node]),
+			self.__enc.copy(variables[in1], variables[node]),
+			self.__enc.copy(variables[in2], variables[node]),
+			self.__enc.xor(variables[in1], variables[in2], variables[node]))
+
+	def check(self):
+		r = self.__s.check()
+		if r == unsat:
+			return True, []
+		elif r == unknown:
+			logger.warning('The solver returned unknown: {}'.format(self.__s.reason_unknown()))
+			return None, []
+		m = self.__s.model()
+		gates = [str(node) for node in self.__probes if is_true(m.eval(self.__probes[node]))]
+		gates += ['output share {}'.format(i) for i in range(len(self.__observed))
+			if is_true(m.eval(self.__observed[i]))]
+		return False, gates
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+from os import _exit, fork, killpg, setpgid, sysconf, waitpid
+from resource import getrlimit, setrlimit, RLIMIT_AS
+from signal import signal, SIG_DFL, SIGKILL, SIGTERM
+from time import perf_counter
+from z3 import *
+from SatBackend import SatBackend
+from logger import logger, fork_init
+
+def run_config(config, assertions, new_solver, memory):
+	# Runs in a forked process, so a crash or an exhausted memory limit only
+	# loses this configuration. Returns the result, the true activation
+	# variables and why the result is unknown.
+	if memory:
+		# The budget comes on top of what the forked process already maps.
+		with open('/proc/self/statm', 'r') as filename:
+			mapped = int(filename.read().split()[0]) * sysconf('SC_PAGE_SIZE')
+		setrlimit(RLIMIT_AS, (mapped + (memory << 20), getrlimit(RLIMIT_AS)[1]))
+		set_param('memory_max_size', memory)
+	try:
+		if config.startswith('seed:'):
+			seed = int(config.split(':', 1)[1])
+			set_param('smt.random_seed', seed)
+			set_param('sat.random_seed', seed)
+			s = new_solver()
+		elif config == 'sat':
+			s = Then('simplify', 'lia2card', 'card2bv', 'bit-blast', 'sat').solver()
+		elif config == 'parallel':
+			set_param('parallel.enable', True)
+			s = Solver()
+		elif config == 'z3':
+			s = new_solver()
+		else:
+			# Everything else is the command of an external SAT solver.
+			r, true_vars = SatBackend(config).solve(assertions)
+			return r, true_vars, 'no result of the SAT solver'
+		s.add(assertions)
+		r = s.check()
+		if r == unsat:
+			return 'unsat', [], None
+		elif r == sat:
+			m = s.model()
+			return 'sat', [str(d) for d in m.decls()
+				if str(d).startswith('activation_') and is_true(m[d])], None
+		return 'unknown', [], s.reason_unknown()
+	except (Z3Exception, MemoryError, OSError) as e:
+		return 'unknown', [], str(e)
+
+class Portfolio(object):
+
+	def __init__(self, configs, new_solver=Solver, timeout=0, memory=0):
+		# timeout is the wall-clock limit in seconds and memory the limit of
+		# every configuration in MB, 0 disables them.
+		self.__configs = configs
+		self.__new_solver = new_solver
+		self.__timeout = timeout
+		self.__memory = memory
+
+	def solve(self, assertions):
+		# Every configuration races on the same query, the first definite
+		# answer wins and the others are stopped.
+		# Plain forks instead of multiprocessing processes, the checks may
+		# already run in daemonic pool workers which cannot have children.
+		procs = {}
+		handler = None
+		try:
+			# A pool worker is terminated by SIGTERM once another check fails,
+			# it must not leave its configurations running.
+			handler = signal(SIGTERM, self.__stop)
+		except ValueError:
+			# Signal handlers can only be set in the main thread.
+			pass
+		try:
+			for config in self.__configs:
+				recv, send = Pipe(False)
+				pid = fork()
+				if pid == 0:
+					# An own process group, so that stopping it also stops an
+					# external solver started by it.
+					setpgid(0, 0)
+					signal(SIGTERM, SIG_DFL)
+					fork_init()
+					recv.close()
+					try:
+						send.send(run_config(config, assertions, self.__new_solver, self.__memory))
+					finally:
+						_exit(0)
+				try:
+					setpgid(pid, pid)
+				except OSError:
+					# The child has already done it.
+					pass
+				send.close()
+				procs[recv] = (config, pid)
+			time_start_abs = perf_counter()
+			result = ('unknown', [])
+			while procs:
+				timeout = None
+				if self.__timeout:
+					timeout = self.__timeout - (perf_counter() - time_start_abs)
+					if timeout <= 0:
+						logger.warning('Portfolio: no answer within {}s'.format(self.__timeout))
+						break
+				ready = wait(list(procs), timeout)
+				for conn in ready:
+					config, pid = procs.pop(conn)
+					try:
+						r, true_vars, reason = conn.recv()
+					except EOFError:
+						r, true_vars, reason = 'unknown', [], 'exited with status {}'.format(
+							waitpid(pid, 0)[1])
+					else:
+						waitpid(pid, 0)
+					conn.close()
+					if r == 'unknown':
+						logger.warning('Portfolio: {} returned unknown: {}'.format(config, reason))
+						continue
+					logger.info('Portfolio: {} answered {} in {}s'.format(
+						config, r, round(perf_counter() - time_start_abs, 2)))
+					result = (r, true_vars)
+					break
+				if result[0] != 'unknown':
+					break
+		finally:
+			for conn, (config, pid) in procs.items():
+				killpg(pid, SIGKILL)
+				waitpid(pid, 0)
+				conn.close()
+			if handler is not None:
+				signal(SIGTERM, handler)
+		return result
+
+	def __stop(self, signum, frame):
+		exit(-1)
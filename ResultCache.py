@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import sqlite3
+from contextlib import contextmanager
+from hashlib import sha256
+from json import dumps, loads
+from os import makedirs, path
+from time import time
+from logger import logger
+
+# Bump whenever a change of the encoding or of the checkers can change a
+# verdict, the cached verdicts of other versions are dropped.
+RESULT_CACHE_VERSION = 1
+
+class ResultCache(object):
+
+	def __init__(self, filename='tmp/cache/results.sqlite'):
+		self.__filename = filename
+		makedirs(path.dirname(filename), exist_ok=True)
+		with self.__connect() as db:
+			db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, '
+				'secure INTEGER, gates TEXT, seconds REAL, created REAL)')
+			version = db.execute('PRAGMA user_version').fetchone()[0]
+			if version != RESULT_CACHE_VERSION:
+				removed = db.execute('DELETE FROM results').rowcount
+				db.execute('PRAGMA user_version = {}'.format(RESULT_CACHE_VERSION))
+				if removed:
+					logger.warning('Result cache: removed {} verdicts of version {}'.format(removed, version))
+
+	@contextmanager
+	def __connect(self):
+		# Pool workers share the file, so every access opens its own
+		# connection and waits for concurrent writers.
+		db = sqlite3.connect(self.__filename, timeout=60)
+		try:
+			with db:
+				yield db
+		finally:
+			db.close()
+
+	@staticmethod
+	def key(digest, labeling, order, mode):
+		key = sha256()
+		for part in (digest, dumps(labeling, sort_keys=True), str(order), mode):
+			key.update(part.encode())
+			key.update(b'\0')
+		return key.hexdigest()
+
+	def get(self, key):
+		with self.__connect() as db:
+			row = db.execute('SELECT secure, gates, seconds FROM results WHERE key = ?',
+				(key,)).fetchone()
+		if row is None:
+			return None
+		return bool(row[0]), loads(row[1]), row[2]
+
+	def put(self, key, check_res, gates, seconds):
+		with self.__connect() as db:
+			db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+				(key, int(check_res), dumps(gates), seconds, time()))
+
+	def prune(self, days=0):
+		with self.__connect() as db:
+			removed = db.execute('DELETE FROM results WHERE created <= ?',
+				(time() - days * 86400,)).rowcount
+		logger.info('Result cache: removed {} entries older than {} days'.format(removed, days))
+		return removed
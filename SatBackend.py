@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from os import path, remove
+from shlex import split
+from subprocess import run, PIPE, STDOUT
+from tempfile import mkstemp
+from z3 import *
+from logger import logger
+
+def to_dimacs(assertions):
+	goal = Goal()
+	goal.add(assertions)
+	cnf = Then('simplify', 'lia2card', 'card2bv', 'bit-blast', 'tseitin-cnf')(goal)
+	if len(cnf) != 1:
+		logger.error('CNF conversion produced {} subgoals instead of one'.format(len(cnf)))
+		exit(-1)
+	return cnf[0].dimacs()
+
+class SatBackend(object):
+
+	def __init__(self, command):
+		self.__command = split(command)
+		# MiniSat writes the model into a result file instead of stdout.
+		self.__minisat = path.basename(self.__command[0]).startswith('minisat')
+
+	def __parse_names(self, dimacs):
+		names = {}
+		for line in dimacs.split('\n'):
+			if line.startswith('c '):
+				_, ind, name = line.split(' ', 2)
+				names[int(ind)] = name
+		return names
+
+	def __parse_output(self, output):
+		result = 'unknown'
+		literals = []
+		lines = output.split('\n')
+		for line in lines:
+			line = line.strip()
+			if line in ('s SATISFIABLE', 'SAT'):
+				result = 'sat'
+			elif line in ('s UNSATISFIABLE', 'UNSAT'):
+				result = 'unsat'
+			elif line.startswith('v '):
+				literals += [int(l) for l in line[2:].split()]
+			elif self.__minisat and result == 'sat' and line:
+				literals += [int(l) for l in line.split()]
+		return result, literals
+
+	def solve(self, assertions):
+		dimacs = to_dimacs(assertions)
+		names = self.__parse_names(dimacs)
+		fd, cnf_file = mkstemp(suffix='.cnf', dir='tmp')
+		with open(fd, 'w') as filename:
+			filename.write(dimacs)
+		command = self.__command + [cnf_file]
+		if self.__minisat:
+			command += [cnf_file + '.out']
+		try:
+			proc = run(command, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+			output = proc.stdout
+			if self.__minisat and path.exists(cnf_file + '.out'):
+				with open(cnf_file + '.out', 'r') as filename:
+					output = filename.read()
+		except OSError as e:
+			# The solver is not installed or cannot be executed.
+			logger.error('SAT solver {} cannot be run: {}'.format(self.__command[0], e))
+			return 'unknown', []
+		finally:
+			for fn in (cnf_file, cnf_file + '.out'):
+				if path.exists(fn):
+					remove(fn)
+		result, literals = self.__parse_output(output)
+		if result == 'unknown':
+			logger.error('SAT solver {} returned no result (exit code {}):\n{}'.
+				format(self.__command[0], proc.returncode, output))
+		true_names = [names[l] for l in literals if l > 0 and l in names]
+		return result, true_names
@@ -4,91 +4,241 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from CircuitGraph import CircuitGraph
+from LabelPropagator import LabelPropagator
+from Portfolio import Portfolio
+from SatBackend import SatBackend, to_dimacs
 from z3 import *
+from LabelEncoding import LabelEncoding
 from json import dump, load, dumps
 from logger import logger
+from time import perf_counter
 
 class Z3Checker(object):
 
-	def __init__(self, circuit, labels, order, mode='transient', check_security=True):
+	def __init__(self, circuit, labels, order, mode='transient', check_security=True, encoding='bool',
+		cardinality='sum', prune_cone=False, prepass=False, backend='z3', changed=None, portfolio=None,
+		timeout=0, memory=0):
 		self.__circuit = circuit
-		self.__labels = labels
+		self.__labelings = labels if type(labels) == list else [labels]
 		self.__order = order
 		self.__mode = mode
 		self.__check_security = check_security
+		self.__encoding = encoding
+		self.__prune_cone = prune_cone
+		self.__prepass = prepass
+		self.__enc = LabelEncoding(encoding, cardinality)
+		if portfolio or timeout or memory:
+			# Limits are enforced by solving in a separate process, even for a
+			# single configuration.
+			self.__backend = Portfolio(portfolio or [backend], self.__enc.new_solver, timeout, memory)
+		else:
+			self.__backend = SatBackend(backend) if backend != 'z3' else None
+		self.__changed = changed
+		self.__solver = None
+		self.__order_bounds = None
+		# In both modes the stable and the transient probing condition share
+		# the propagation, each one is guarded by its own literal.
+		if mode == 'both':
+			self.__mode_guards = dict((m, Bool('mode_{}'.format(m))) for m in ('stable', 'transient'))
+		else:
+			self.__mode_guards = {mode: None}
 		self.__checker_init()
 		self.__process_circuit()
 	
 	def __checker_init(self):
-		self.__s = Solver()
-		secret_list = []
-		mask_list = []
-		unimportant_list = []
-		variables = []
+		self.__s = self.__enc.new_solver()
+		labeling_variables = []
 		self.__variables_stable = {}
 		self.__variables_transient = {}
 		variables_activation = {}
 
-		for node in self.__circuit.nodes():
-			if self.__circuit[node]['node_type'] == 'port':
-				for label in self.__labels[str(node)]:
-					variables += [label]
-					label_type = label.split('_')[0]
-					if label_type == 's':
-						secret_list += [label]
-					elif label_type == 'm':
-						mask_list += [label]
-					elif label_type == 'y':
-						unimportant_list += [label]
-					else:
-						logger.error('Unknown label type of the label {} for the node {}'.format(label, node))
-						exit(-1)
-
-		variables = sorted(set(variables) - set(unimportant_list))
-		secret_list = set(secret_list)
-		mask_list = set(mask_list)
+		for labels in self.__labelings:
+			variables = []
+			for node in self.__circuit.nodes():
+				if self.__circuit.node_type(node) == 'port':
+					for label in labels[str(node)]:
+						label_type = label.split('_')[0]
+						if label_type in ('s', 'm'):
+							variables += [label]
+						elif label_type != 'y':
+							logger.error('Unknown label type of the label {} for the node {}'.format(label, node))
+							exit(-1)
+			labeling_variables += [sorted(set(variables))]
 
-		self.__masks = mask_list
-		self.__secrtes = secret_list
+		# All labelings share one set of label variables: the i-th label of
+		# every labeling is mapped onto the i-th variable of each node. Only
+		# the port and the probing constraints depend on the labeling.
+		if len(self.__labelings) == 1:
+			variables = labeling_variables[0]
+			self.__labeling_constraints = None
+		else:
+			variables = ['v_{}'.format(i) for i in range(max(len(v) for v in labeling_variables))]
+			self.__labeling_constraints = [[] for l in self.__labelings]
+		self.__slots = [{v: i for i, v in enumerate(lv)} for lv in labeling_variables]
 
-		activation_sum = Int('activation_sum')
+		self.__candidates = set(self.__circuit.nodes())
+		self.__encoded = set(self.__circuit.nodes())
+		self.__labeling_candidates = [self.__candidates for l in self.__labelings]
+		if self.__prepass:
+			self.__labeling_candidates = [LabelPropagator(self.__circuit, labels,
+				self.__order, self.__mode).get_candidates() for labels in self.__labelings]
+			self.__candidates = set().union(*self.__labeling_candidates)
+			logger.info('Label propagation: {} of {} nodes remain probing candidates'.
+				format(len(self.__candidates), len(self.__encoded)))
+		if self.__prune_cone:
+			self.__candidates, self.__encoded = self.__cone_of_influence(self.__candidates)
+		if self.__changed is not None and self.__order == 1:
+			# A single probe has to be a changed node itself, so only the
+			# fan-in of the changed nodes is encoded.
+			self.__candidates = self.__candidates & self.__changed
+			self.__labeling_candidates = [c & self.__changed for c in self.__labeling_candidates]
+			graph = self.__circuit
+			encoded = 0
+			for node in self.__candidates:
+				i = graph.index(node)
+				encoded |= graph.fan_in_ids(i) | (1 << i)
+			self.__encoded = self.__encoded & set(graph.names_of(encoded))
+		if not self.__candidates:
+			self.__encoded = set()
+			return
 
+		# In the bit-vector encoding the i-th bit of a node's vector is the
+		# i-th label variable of the Boolean encoding.
+		self.__width = max(len(variables), 1)
 		for node in self.__circuit.nodes():
-			self.__variables_stable[node] = [Bool('{}_{}_stable'.format(v, node)) for v in variables]
-			variables_activation[node] = Bool('activation_{}'.format(node))
-			if self.__mode == 'transient':
-				self.__variables_transient[node] = [Bool('{}_{}_transient'.format(v, node)) for v in variables]
+			if node not in self.__encoded:
+				# The node never carries a label that matters, so it is
+				# replaced by the empty label set.
+				if self.__encoding == 'bv':
+					self.__variables_stable[node] = BitVecVal(0, self.__width)
+				else:
+					self.__variables_stable[node] = [BoolVal(False) for v in variables]
+				self.__variables_transient[node] = self.__variables_stable[node]
+				continue
+			if self.__encoding == 'bv':
+				self.__variables_stable[node] = BitVec('{}_stable'.format(node), self.__width)
+			else:
+				self.__variables_stable[node] = [Bool('{}_{}_stable'.format(v, node)) for v in variables]
+			if node in self.__candidates:
+				variables_activation[node] = Bool('activation_{}'.format(node))
+			if self.__mode != 'stable':
+				if self.__encoding == 'bv':
+					self.__variables_transient[node] = BitVec('{}_transient'.format(node), self.__width)
+				else:
+					self.__variables_transient[node] = [Bool('{}_{}_transient'.format(v, node)) for v in variables]
 		if self.__check_security:
-			activation_sum = Sum([If(variables_activation[node], 1, 0) for node in self.__circuit.nodes()])
-			self.__s.add(activation_sum <= self.__order)
-			self.__s.add(activation_sum > 0)
+			activations = list(variables_activation.values())
+			self.__activations = activations
+			self.__s.add(self.__enc.at_most(self.__s, activations, self.__order, 'probe'))
+			self.__s.add(self.__enc.at_least_one(activations))
+			if self.__changed is not None:
+				# Only probe sets touching a changed node have to be checked,
+				# all others were proven secure on the previous netlist.
+				self.__s.add(Or([variables_activation[node] for node in variables_activation
+					if node in self.__changed]))
+			for l, candidates in enumerate(self.__labeling_candidates):
+				excluded = [Not(variables_activation[node]) for node in variables_activation
+					if node not in candidates]
+				if excluded:
+					self.__add_labeling_constraint(l, And(excluded))
+
+			if self.__mode == 'both':
+				# A plain check looks for a leak in either mode.
+				self.__s.add(Or(list(self.__mode_guards.values())))
+			for mode, guard in self.__mode_guards.items():
+				if mode == 'transient':
+					variables_probed = self.__variables_transient
+				else:
+					variables_probed = self.__variables_stable
+				self.__add_probing_constraints(variables_activation, variables_probed,
+					len(variables), guard)
 
-			variables_checking_gate = {}
-			for var in variables:
-				variables_checking_gate[var] = Bool('{}_checking_gate'.format(var))
+	def __add_probing_constraints(self, variables_activation, variables_probed, n, guard=None):
+		if self.__encoding == 'bv':
+			checking_gate = BitVecVal(0, self.__width)
+			for node in variables_activation:
+				checking_gate = checking_gate ^ If(variables_activation[node],
+					variables_probed[node], BitVecVal(0, self.__width))
+			for l, slots in enumerate(self.__slots):
+				secrets = sum(1 << slots[var] for var in slots if var.split('_')[0] == 's')
+				masks = sum(1 << slots[var] for var in slots if var.split('_')[0] != 's')
+				constraint = And(checking_gate & secrets != 0, checking_gate & masks == 0)
+				self.__add_labeling_constraint(l,
+					constraint if guard is None else Implies(guard, constraint))
+		else:
+			variables_checking_gate = []
+			for i in range(n):
 				lst = []
-				for node in self.__circuit.nodes():
-					if self.__mode == 'transient':
-						ind = [str(i) for i in self.__variables_transient[node]].index('{}_{}_transient'.format(var, node))
-						lst += [And(variables_activation[node], self.__variables_transient[node][ind])]
+				for node in variables_activation:
+					lst += [And(variables_activation[node], variables_probed[node][i])]
+				variables_checking_gate += [self.__enc.xor_list(lst)]
+
+			for l, slots in enumerate(self.__slots):
+				checking_secrets = []
+				checking_masks = []
+				for var in slots:
+					if var.split('_')[0] == 's':
+						checking_secrets += [variables_checking_gate[slots[var]]]
 					else:
-						ind = [str(i) for i in self.__variables_stable[node]].index('{}_{}_stable'.format(var, node))
-						lst += [And(variables_activation[node], self.__variables_stable[node][ind])] 
-				variables_checking_gate[var] = self.__xor_list(lst)
-
-			checking_secrets = []
-			checking_masks = []
-			for var in variables_checking_gate:
-				v = '_'.join(str(var).split('_')[:2])
-				if v in secret_list:
-					checking_secrets += [variables_checking_gate[var]]
-				elif v in mask_list:
-					checking_masks += [variables_checking_gate[var]]
-			self.__s.add(And([Or(checking_secrets)] + [Not(v) for v in checking_masks]))
+						checking_masks += [variables_checking_gate[slots[var]]]
+				constraint = And([Or(checking_secrets)] + [Not(v) for v in checking_masks])
+				self.__add_labeling_constraint(l,
+					constraint if guard is None else Implies(guard, constraint))
+
+	def __cone_of_influence(self, allowed):
+		graph = self.__circuit
+		candidates = 0
+		reach_any = 0
+		for labels, slots in zip(self.__labelings, self.__slots):
+			# cover[v] has a bit for every node the label v can propagate to
+			cover = [0] * len(slots)
+			for node in graph.nodes():
+				if graph.node_type(node) == 'port':
+					i = graph.index(node)
+					for v in labels[str(node)]:
+						if v in slots:
+							cover[slots[v]] |= graph.fan_out_ids(i) | (1 << i)
+			for c in cover:
+				reach_any |= c
+			# A single probe has to carry a secret itself. For higher orders
+			# a probe can also cancel a mask of another probe, so the cone is
+			# extended by the nodes sharing a mask with it until fixpoint.
+			cone = 0
+			for v in slots:
+				if v.split('_')[0] == 's':
+					cone |= cover[slots[v]]
+			while self.__order > 1:
+				extended = 0
+				for c in cover:
+					if c & cone:
+						extended |= c
+				if extended == cone:
+					break
+				cone = extended
+			candidates |= cone
+		candidates &= graph.bits(allowed)
+		encoded = candidates
+		for i in graph.ids_of(candidates):
+			encoded |= graph.fan_in_ids(i)
+		encoded &= reach_any
+		candidates = set(graph.names_of(candidates))
+		encoded = set(graph.names_of(encoded))
+		nodes = len(graph)
+		logger.info('Cone of influence: {} of {} nodes are probing candidates, {} nodes are encoded, {} nodes are pruned'.
+			format(len(candidates), nodes, len(encoded), nodes - len(encoded)))
+		return candidates, encoded
+
+	def __add_labeling_constraint(self, labeling, constraint):
+		if self.__labeling_constraints is None:
+			self.__s.add(constraint)
+		else:
+			self.__labeling_constraints[labeling].append(constraint)
 
 	def __process_circuit(self):
 		for node in self.__circuit.nodes():
-			node_type = self.__circuit[node]['node_type']
+			if node not in self.__encoded:
+				continue
+			node_type = self.__circuit.node_type(node)
 			if node_type == 'port':
 				self.__process_port_gate(node)
 			elif node_type in ('xor', 'xnor'):
@@ -107,19 +257,19 @@ class Z3Checker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 2:
 			in1, in2 = pred
-			self.__s.add(self.__z3_xor(self.__variables_stable[in1],
+			self.__s.add(self.__enc.xor(self.__variables_stable[in1],
 				self.__variables_stable[in2],
 				self.__variables_stable[gate]))
-			if self.__mode == 'transient':
-				self.__s.add(Or(self.__z3_empty(self.__variables_transient[gate]),
-				self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]),
-				self.__z3_copy(self.__variables_transient[in2], self.__variables_transient[gate]),
-				self.__z3_xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
+			if self.__mode != 'stable':
+				self.__s.add(Or(self.__enc.empty(self.__variables_transient[gate]),
+				self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]),
+				self.__enc.copy(self.__variables_transient[in2], self.__variables_transient[gate]),
+				self.__enc.xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
 		elif len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
-			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			if self.__mode != 'stable':
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one or two'.format(gate))
 			exit(-1)
@@ -128,20 +278,20 @@ class Z3Checker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 2:
 			in1, in2 = pred
-			self.__s.add(Or(self.__z3_empty(self.__variables_stable[gate]),
-				self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]),
-				self.__z3_copy(self.__variables_stable[in2], self.__variables_stable[gate]),
-				self.__z3_xor(self.__variables_stable[in1], self.__variables_stable[in2], self.__variables_stable[gate])))
-			if self.__mode == 'transient':
-				self.__s.add(Or(self.__z3_empty(self.__variables_transient[gate]),
-					self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]),
-					self.__z3_copy(self.__variables_transient[in2], self.__variables_transient[gate]),
-					self.__z3_xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
+			self.__s.add(Or(self.__enc.empty(self.__variables_stable[gate]),
+				self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]),
+				self.__enc.copy(self.__variables_stable[in2], self.__variables_stable[gate]),
+				self.__enc.xor(self.__variables_stable[in1], self.__variables_stable[in2], self.__variables_stable[gate])))
+			if self.__mode != 'stable':
+				self.__s.add(Or(self.__enc.empty(self.__variables_transient[gate]),
+					self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]),
+					self.__enc.copy(self.__variables_transient[in2], self.__variables_transient[gate]),
+					self.__enc.xor(self.__variables_transient[in1], self.__variables_transient[in2], self.__variables_transient[gate])))
 		elif len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
-			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			if self.__mode != 'stable':
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one or two'.format(gate))
 			exit(-1)
@@ -150,48 +300,36 @@ class Z3Checker(object):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
-			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_transient[in1], self.__variables_transient[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			if self.__mode != 'stable':
+				self.__s.add(self.__enc.copy(self.__variables_transient[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one'.format(gate))
 			exit(-1)
 
 	def __process_port_gate(self, gate):
-		lst = []
-		neg_lst = []
-		for v in self.__variables_stable[gate]:
-			var = '_'.join(str(v).split('_')[:-2])
-			if var in self.__labels[str(gate)]:
-				lst.append(v)
-			else:
-				neg_lst.append(v)
-		self.__s.add(And(lst + [Not(v) for v in neg_lst]))
-		if self.__mode == 'transient':
-			lst = []
-			neg_lst = []
-			for v in self.__variables_transient[gate]:
-				var = '_'.join(str(v).split('_')[:-2])
-				if var in self.__labels[str(gate)]:
-					lst.append(v)
-				else:
-					neg_lst.append(v)
-			self.__s.add(And(lst + [Not(v) for v in neg_lst]))
+		for l, labels in enumerate(self.__labelings):
+			slots = [self.__slots[l][v] for v in labels[str(gate)] if v in self.__slots[l]]
+			self.__add_labeling_constraint(l,
+				self.__enc.assign(self.__variables_stable[gate], slots))
+			if self.__mode != 'stable':
+				self.__add_labeling_constraint(l,
+					self.__enc.assign(self.__variables_transient[gate], slots))
 
 	def __process_register_gate(self, gate):
 		pred = self.__circuit.predecessors(gate)
 		if len(pred) == 1:
 			in1 = pred[0]
-			self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_stable[gate]))
-			if self.__mode == 'transient':
-				self.__s.add(self.__z3_copy(self.__variables_stable[in1], self.__variables_transient[gate]))
+			self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_stable[gate]))
+			if self.__mode != 'stable':
+				self.__s.add(self.__enc.copy(self.__variables_stable[in1], self.__variables_transient[gate]))
 		else:
 			logger.error('Number of inputs for the gate {} should be equal to one'.format(gate))
 			exit(-1)
 
-	def __analyze_model(self, model_file=None):
+	def __analyze_model(self, s, model_file=None):
 		suspicious_gates = []
-		m = self.__s.model()
+		m = s.model()
 		model = {}
 		for var in m:
 			model[str(var)] = is_true(m[var])
@@ -203,37 +341,141 @@ class Z3Checker(object):
 				fn.write(dumps(model))
 		return suspicious_gates
 
-	def __z3_xor(self, in1, in2, out):
-		lst = []
-		for i in range(len(in1)):
-			lst.append(out[i] == Xor(in1[i], in2[i]))
-		return And(lst)
-
-	def __xor_list(self, lst):
-		if len(lst) == 2:
-			return Xor(lst[0], lst[1])
-		else:
-			return Xor(lst[0], self.__xor_list(lst[1:]))
-
-	def __z3_copy(self, inp, out):
-		lst = []
-		for i in range(len(inp)):
-			lst.append(out[i] == inp[i])
-		return And(lst)
+	def get_formula_size(self, labeling=0):
+		assertions = list(self.__s.assertions())
+		if self.__labeling_constraints is not None:
+			assertions += self.__labeling_constraints[labeling]
+		seen = set()
+		variables = 0
+		worklist = list(assertions)
+		while worklist:
+			e = worklist.pop()
+			if e.get_id() in seen:
+				continue
+			seen.add(e.get_id())
+			if is_const(e) and e.decl().kind() == Z3_OP_UNINTERPRETED:
+				variables += 1
+			else:
+				worklist += e.children()
+		return {'variables': variables, 'assertions': len(assertions), 'terms': len(seen)}
 
-	def __z3_empty(self, out):
-		lst = []
-		for o in out:
-			lst.append(Not(o))
-		return And(lst)
+	def get_statistics(self):
+		# Statistics of the last solver call, e.g. conflicts, decisions and memory.
+		if self.__solver is None:
+			return {}
+		st = self.__solver.statistics()
+		return dict((k, st.get_key_value(k)) for k in st.keys())
 
 	def dump_smt2(self, fn='tmp/out.smt2'):
 		with open(fn, 'w') as filename:
 			filename.write(self.__s.to_smt2())
 
-	def check(self):
-		r = self.__s.check()
+	def dump_dimacs(self, fn='tmp/out.cnf', labeling=0):
+		with open(fn, 'w') as filename:
+			filename.write(to_dimacs(self.__query(labeling).assertions()))
+
+	def __query(self, labeling):
+		if self.__labeling_constraints is None:
+			return self.__s
+		s = self.__enc.new_solver()
+		s.add(self.__s.assertions())
+		s.add(self.__labeling_constraints[labeling])
+		return s
+
+	def check(self, labeling=0):
+		if not self.__labeling_candidates[labeling] & self.__candidates:
+			logger.info('No probing candidates are left, the solver is not called')
+			return True, []
+		# Z3 falls back to its much slower incremental core as soon as
+		# push/pop or assumptions are used, so each labeling is solved by a
+		# fresh solver on top of the already built shared encoding.
+		return self.__solve(self.__query(labeling))
+
+	def check_orders(self, labeling=0, max_order=None):
+		# Raises the probing order from 1 up to max_order, by default the order
+		# of the encoding, until a probe set leaks. Returns the highest secure
+		# order and the leak at the next order, None if that one is unknown.
+		if max_order is None or max_order > self.__order:
+			max_order = self.__order
+		if not self.__labeling_candidates[labeling] & self.__candidates:
+			logger.info('No probing candidates are left, the solver is not called')
+			return max_order, []
+		if self.__order_bounds is None:
+			# The encoding is built once for the highest order, a lower order
+			# is enabled by asserting its bound literal in the query.
+			self.__order_bounds = []
+			for k in range(1, self.__order):
+				bound = Bool('order_{}'.format(k))
+				self.__s.add(Implies(bound, self.__enc.at_most(self.__s, self.__activations, k, 'probe')))
+				self.__order_bounds.append(bound)
+			self.__order_bounds.append(BoolVal(True))
+		query = self.__query(labeling).assertions()
+		for k in range(1, max_order + 1):
+			s = self.__enc.new_solver()
+			s.add(query)
+			s.add(self.__order_bounds[k - 1])
+			check_res, gates = self.__solve(s)
+			logger.info('Order {}: {}, {}'.format(k, check_res, gates))
+			if check_res is None:
+				return k - 1, None
+			if not check_res:
+				return k - 1, gates
+		return max_order, []
+
+	def check_modes(self, labeling=0):
+		# Solves the probing condition of every mode on the shared encoding,
+		# returns the result, the leak and the seconds per mode.
+		if not self.__labeling_candidates[labeling] & self.__candidates:
+			logger.info('No probing candidates are left, the solver is not called')
+			return dict((mode, (True, [], 0)) for mode in self.__mode_guards)
+		res = {}
+		query = self.__query(labeling).assertions()
+		for mode, guard in self.__mode_guards.items():
+			time_start_abs = perf_counter()
+			s = self.__enc.new_solver()
+			s.add(query)
+			if guard is not None:
+				s.add(guard)
+			check_res, gates = self.__solve(s)
+			res[mode] = (check_res, gates, perf_counter() - time_start_abs)
+			logger.info('Mode {}: {}, {}'.format(mode, check_res, gates))
+		return res
+
+	def check_all(self, labeling=0, limit=0):
+		# Yields the leaks one by one, and None if the solver gives up before
+		# all of them are found.
+		if not self.__labeling_candidates[labeling] & self.__candidates:
+			logger.info('No probing candidates are left, the solver is not called')
+			return
+		s = self.__enc.new_solver()
+		s.add(self.__query(labeling).assertions())
+		found = 0
+		while not limit or found < limit:
+			check_res, gates = self.__solve(s)
+			if check_res is None:
+				yield None
+				return
+			if check_res or not gates:
+				return
+			yield gates
+			found += 1
+			# Blocking the probes of a leak also blocks all of its supersets.
+			s.add(Or([Not(Bool('activation_{}'.format(g))) for g in gates]))
+
+	def __solve(self, s):
+		if self.__backend:
+			r, true_vars = self.__backend.solve(s.assertions())
+			if r == 'unknown':
+				return None, []
+			elif r == 'unsat':
+				return True, []
+			return False, ['_'.join(v.split('_')[1:]) for v in true_vars if v.startswith('activation_')]
+		self.__solver = s
+		r = s.check()
 		if r == unsat:
 			return True, []
+		elif r == unknown:
+			logger.warning('The solver returned unknown: {}'.format(s.reason_unknown()))
+			return None, []
 		else:
-			return False, self.__analyze_model()
+			return False, self.__analyze_model(s)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from argparse import ArgumentParser
+from csv import DictWriter
+from json import dumps, load
+from multiprocessing import Pipe, Process
+from os import path
+from resource import getrusage, RUSAGE_SELF
+from sys import stderr, stdout
+from time import perf_counter
+from CircuitGraph import CircuitGraph
+from Z3Checker import Z3Checker
+from helpers import generate_labeling
+from logger import logger, setup_logging, worker_init, workers_terminated, LEVELS, HOT_MODES
+
+# wall and cpu are seconds, rss is the peak resident set size in KB
+FIELDS = ['name', 'order', 'mode', 'verdict', 'gates', 'wall', 'cpu', 'rss',
+	'variables', 'assertions', 'terms']
+MODES = {'s': 'stable', 't': 'transient'}
+
+def run_benchmark(bench, mode, options, conn):
+	# Runs in its own process, so CPU time and peak RSS belong to this
+	# benchmark alone.
+	worker_init()
+	netlist = path.join(path.dirname(bench['manifest']), bench['netlist'])
+	labeling = path.join(path.dirname(bench['manifest']), bench['labeling'])
+	time_start_abs = perf_counter()
+	labelings = generate_labeling(labeling)
+	circuit = CircuitGraph(json_file=netlist)
+	verdict, gates = True, []
+	checkers = []
+	for labels in labelings:
+		circuit.set_labeling(labels)
+		checker = Z3Checker(circuit.get_graph(), labels, bench['order'], MODES[mode], **options)
+		checkers.append(checker)
+		verdict, gates = checker.check()
+		if not verdict:
+			break
+	wall = perf_counter() - time_start_abs
+	usage = getrusage(RUSAGE_SELF)
+	size = {'variables': 0, 'assertions': 0, 'terms': 0}
+	for checker in checkers:
+		for k, v in checker.get_formula_size().items():
+			size[k] += v
+	conn.send({'verdict': verdict, 'gates': gates, 'wall': wall,
+		'cpu': usage.ru_utime + usage.ru_stime, 'rss': usage.ru_maxrss, **size})
+	conn.close()
+
+def run_benchmarks(manifest, names, modes, timeout, options):
+	with open(manifest, 'r') as filename:
+		benchmarks = load(filename)
+	results = []
+	for bench in benchmarks:
+		if names and bench['name'] not in names:
+			continue
+		bench['manifest'] = manifest
+		for mode in bench.get('modes', modes):
+			if mode not in modes:
+				continue
+			res = {'name': bench['name'], 'order': bench['order'], 'mode': mode}
+			recv, send = Pipe(False)
+			p = Process(target=run_benchmark, args=(bench, mode, options, send))
+			time_start_abs = perf_counter()
+			p.start()
+			send.close()
+			if recv.poll(bench.get('timeout', timeout)):
+				try:
+					res.update(recv.recv())
+				except EOFError:
+					res['verdict'] = 'error'
+			else:
+				res['verdict'] = 'timeout'
+				res['wall'] = perf_counter() - time_start_abs
+				workers_terminated()
+				p.terminate()
+			p.join()
+			logger.info('Benchmark {} ({}): {}'.format(res['name'], mode, res))
+			print('{} {}: {} in {}s'.format(res['name'], mode, res['verdict'],
+				round(res.get('wall', 0), 2)), file=stderr, flush=True)
+			results.append(res)
+	return results
+
+def compare(results, baseline, threshold, min_seconds):
+	# A benchmark regresses if its verdict changed or it got more than
+	# threshold slower or bigger than in the baseline.
+	reference = dict(((r['name'], r['mode']), r) for r in baseline)
+	regressions = []
+	for res in results:
+		ref = reference.get((res['name'], res['mode']))
+		if ref is None:
+			continue
+		if res['verdict'] != ref['verdict']:
+			regressions.append('{} {}: verdict {} instead of {}'.format(
+				res['name'], res['mode'], res['verdict'], ref['verdict']))
+			continue
+		for field in ('wall', 'cpu', 'rss'):
+			if field not in res or field not in ref:
+				continue
+			limit = ref[field] * (1 + threshold)
+			if field in ('wall', 'cpu'):
+				limit = max(limit, ref[field] + min_seconds)
+			if res[field] > limit:
+				regressions.append('{} {}: {} {} exceeds {} (baseline {})'.format(
+					res['name'], res['mode'], field, round(res[field], 2), round(limit, 2),
+					round(ref[field], 2)))
+	return regressions
+
+def write_results(results, fmt, fn):
+	out = open(fn, 'w') if fn else stdout
+	if fmt == 'csv':
+		writer = DictWriter(out, FIELDS, extrasaction='ignore')
+		writer.writeheader()
+		for res in results:
+			writer.writerow(res)
+	else:
+		out.write(dumps(results, indent=True) + '\n')
+	if fn:
+		out.close()
+
+if __name__ == '__main__':
+	parser = ArgumentParser(prog='Rebecca benchmarks',
+		description='Runs the benchmarks of a manifest and compares them against a baseline')
+	parser.add_argument('-m', '--manifest', default='benchmarks/benchmarks.json', metavar='<manifest>',
+		help='JSON list of benchmarks with name, netlist, labeling, order and optionally modes and timeout')
+	parser.add_argument('-b', '--benchmark', nargs='+', default=[], metavar='<name>',
+		help='run only the given benchmarks')
+	parser.add_argument('--modes', nargs='+', choices=['s', 't'], default=['s', 't'],
+		help='modes to run every benchmark in')
+	parser.add_argument('-t', '--timeout', type=float, default=600, metavar='<seconds>',
+		help='default timeout of a single benchmark run')
+	parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+		help='output format of the results')
+	parser.add_argument('-w', '--output', metavar='<file>',
+		help='write the results to <file> instead of stdout')
+	parser.add_argument('--baseline', metavar='<file>',
+		help='JSON results of an earlier run; exit with an error on regressions against it')
+	parser.add_argument('--threshold', type=float, default=0.2, metavar='<ratio>',
+		help='allowed relative slowdown or memory growth against the baseline')
+	parser.add_argument('--min-seconds', type=float, default=1.0, metavar='<seconds>',
+		help='timing differences below this are never regressions')
+	parser.add_argument('-e', '--encoding', choices=['bool', 'bv'], default='bool',
+		help='encode the labels of a node as Boolean variables (bool) or as one bit-vector (bv)')
+	parser.add_argument('--cardinality', choices=['sum', 'pb', 'seq'], default='sum',
+		help='encode the probe budget as integer sum (sum), pseudo-Boolean constraint (pb) or sequential counter (seq)')
+	parser.add_argument('--prune-cone', action='store_true',
+		help='encode only the nodes in the cone of influence of the secrets')
+	parser.add_argument('--prepass', action='store_true',
+		help='exclude probing candidates by a fast label propagation before solving')
+	parser.add_argument('--log-level', choices=list(LEVELS), default='debug',
+		help='write log records of at least this level')
+	parser.add_argument('--log-file', default='tmp/log.txt', metavar='<file>',
+		help='write the log to <file>, - for stderr')
+	parser.add_argument('--log-hot', choices=HOT_MODES, default='log',
+		help='log the diagnostics repeated per cell or wire one by one (log), only their number (count) or not at all (drop)')
+	args = vars(parser.parse_args())
+	setup_logging(args['log_level'], args['log_file'], args['log_hot'])
+	options = {'encoding': args['encoding'], 'cardinality': args['cardinality'],
+		'prune_cone': args['prune_cone'], 'prepass': args['prepass']}
+	results = run_benchmarks(args['manifest'], args['benchmark'], args['modes'],
+		args['timeout'], options)
+	write_results(results, args['format'], args['output'])
+	if args['baseline']:
+		with open(args['baseline'], 'r') as filename:
+			regressions = compare(results, load(filename), args['threshold'], args['min_seconds'])
+		for r in regressions:
+			print('REGRESSION: {}'.format(r))
+		if regressions:
+			exit(1)
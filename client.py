@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+# Only the standard library is imported, so a job does not pay for loading
+# z3 or parsing the netlist, the daemon of verify.py --daemon does that.
+
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import path
+from socket import socket, AF_UNIX, SOCK_STREAM
+
+def send_job(socket_file, job):
+	with socket(AF_UNIX, SOCK_STREAM) as conn:
+		conn.connect(socket_file)
+		with conn.makefile('rw') as stream:
+			stream.write(dumps(job) + '\n')
+			stream.flush()
+			for line in stream:
+				record = loads(line)
+				if 'result' in record or 'error' in record:
+					return record
+				# One line per checked labeling.
+				print(dumps(record), flush=True)
+	return {'error': 'the daemon closed the connection'}
+
+if __name__ == '__main__':
+	parser = ArgumentParser(prog='Rebecca client',
+		description='Sends a job to a running verify.py --daemon and prints its results as they arrive')
+	parser.add_argument('-S', '--socket', default='tmp/rebecca.sock', metavar='<socket>',
+		help='Unix socket of the daemon')
+	parser.add_argument('-c', '--check', nargs=4, metavar=('<netlist>', '<order>', '<labeling>', '<mode>'),
+		help='check if a parsed netlist <netlist> is <order>-order secure with the <labeling> as initial labeling; mode = s (stable) | t (transient)')
+	parser.add_argument('-i', '--independence-check', nargs=3, metavar=('<netlist>', '<order>', '<labeling>'),
+		help='check if a parsed netlist <netlist> is <order>-order independent with the <labeling> as initial labeling')
+	parser.add_argument('-e', '--encoding', choices=['bool', 'bv'],
+		help='encode the labels of a node as Boolean variables (bool) or as one bit-vector (bv)')
+	parser.add_argument('--cardinality', choices=['sum', 'pb', 'seq'],
+		help='encode the probe budget as integer sum (sum), pseudo-Boolean constraint (pb) or sequential counter (seq)')
+	parser.add_argument('--shutdown', action='store_true',
+		help='stop the daemon')
+	args = vars(parser.parse_args())
+	options = dict((k, args[k]) for k in ('encoding', 'cardinality') if args[k])
+	# The daemon may run in another directory than the client.
+	for design in (args['check'], args['independence_check']):
+		if design:
+			design[0], design[2] = path.abspath(design[0]), path.abspath(design[2])
+	if args['check']:
+		job = {'check': args['check'], 'options': options}
+	elif args['independence_check']:
+		job = {'independence_check': args['independence_check'], 'options': options}
+	elif args['shutdown']:
+		job = {'shutdown': True}
+	else:
+		parser.error('one of -c, -i or --shutdown is required')
+	record = send_job(args['socket'], job)
+	if 'error' in record:
+		print('ERR: {}'.format(record['error']))
+		exit(2)
+	res = record['result']
+	print(tuple(res) if type(res) == list else res)
+	# Hooks can rely on the exit code, 1 means insecure or dependent and 3
+	# that the solver gave no verdict.
+	verdict = res[0] if type(res) == list else res
+	if verdict is False:
+		exit(1)
+	elif verdict is None:
+		exit(3)
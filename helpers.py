@@ -3,10 +3,18 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+from hashlib import sha256
 from itertools import combinations, permutations
 from mako.template import Template
-from os import system
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from os import makedirs, path, replace
+from re import sub
+from shutil import rmtree, which
+from subprocess import run, PIPE, STDOUT
+from tempfile import mkdtemp
 from json import dumps, load
+from logger import logger
 
 def is_int(s):
     try: 
@@ -86,6 +94,39 @@ def generate_labeling(filename):
 			s_ind += 1
 	return [labels]
 
+def generate_pini_labeling(filename, outputs=()):
+	# Every input share gets a label of its own, the i-th bit of a share
+	# group being share index i. Returns the labeling and the share index of
+	# every share label; plain secrets are no shares and are not labeled,
+	# neither are the output bits, which are observed instead.
+	labels = {}
+	indices = {}
+	share = {}
+	m_ind = s_ind = u_ind = 1
+	with open(filename, 'r') as fp:
+		for line in fp.readlines():
+			var,val = line.split(':')
+			b = var.split('_')[-1]
+			t = val.split()[0]
+			if t == 'mask':
+				labels[b] = ['m_{}'.format(m_ind)]
+				m_ind += 1
+			elif t == 'share' and b in outputs:
+				n = val.split()[1]
+				share[n] = share.get(n, 0) + 1
+				labels[b] = ['y_{}'.format(u_ind)]
+				u_ind += 1
+			elif t == 'share':
+				n = val.split()[1]
+				share[n] = share.get(n, 0) + 1
+				labels[b] = ['s_{}'.format(s_ind)]
+				indices['s_{}'.format(s_ind)] = share[n] - 1
+				s_ind += 1
+			else:
+				labels[b] = ['y_{}'.format(u_ind)]
+				u_ind += 1
+	return labels, indices
+
 def generate_optimized_labeling(filename):
 	ordinary_labels = {}
 	unimportant = []
@@ -139,24 +180,86 @@ def generate_optimized_labeling(filename):
 		tmp = {** ordinary_labels}
 	return labels
 
-def parse_verilog(verilog_files, top_module, template_file='template/yosys.txt'):
-	template = Template(filename=template_file)
-	basename = ''.join(verilog_files.split('.')[:-1])
+def get_gadget_modules(circuit_json):
+	top_module = circuit_json['top_module']
+	modules = set()
+	for c in circuit_json['modules'][top_module]['cells'].values():
+		if c['type'] in circuit_json['modules']:
+			modules.add(c['type'])
+	return sorted(modules)
+
+def get_gadget_labeling_file(basename, module):
+	return '{}_{}.txt'.format(basename, sub(r'[^A-Za-z0-9_]', '_', module))
+
+def write_labeling_template(module_json, filename):
+	with open(filename, 'w') as fn:
+		for port in sorted(module_json['ports']):
+			bits = [str(i) for i in module_json['ports'][port]['bits']]
+			for bit in sorted(bits):
+				fn.write('{}_{}: unimportant\n'.format(port, bit))
+
+def parse_verilog(verilog_files, top_module, template_file='template/yosys.txt', cache_dir='tmp/cache', gadgets=[]):
 	files = verilog_files if type(verilog_files) == list else [verilog_files]
-	yosys_script = template.render(input_files=files, top_module=top_module)
-	with open('tmp/synth.ys', 'w') as filename:
-		filename.write(yosys_script)
-	system('yosys {}'.format('tmp/synth.ys'))
-	with open('tmp/out.json', 'r') as filename:
-		circuit_json = load(filename)
-	circuit_json['top_module'] = top_module
+	basename = ''.join(files[0].split('.')[:-1])
+	# The synthesized netlist is cached by the sources, top module and template.
+	digest = sha256()
+	for fn in files + [template_file]:
+		with open(fn, 'rb') as filename:
+			digest.update(filename.read())
+	digest.update(top_module.encode())
+	for gadget in gadgets:
+		digest.update(b'\0' + gadget.encode())
+	cache_file = path.join(cache_dir, '{}.netlist.json'.format(digest.hexdigest()))
+	if path.exists(cache_file):
+		logger.info('parse verilog: using cached netlist {} for {}'.format(cache_file, basename))
+		with open(cache_file, 'r') as filename:
+			circuit_json = load(filename)
+	else:
+		# Every run gets its own work dir, so parses can run concurrently.
+		work_dir = mkdtemp(prefix='yosys_', dir='tmp')
+		try:
+			template = Template(filename=template_file)
+			yosys_script = template.render(input_files=files, top_module=top_module,
+				gadgets=gadgets, output_dir=work_dir)
+			with open(path.join(work_dir, 'synth.ys'), 'w') as filename:
+				filename.write(yosys_script)
+			try:
+				proc = run(['yosys', path.join(work_dir, 'synth.ys')], stdout=PIPE, stderr=STDOUT,
+					universal_newlines=True)
+			except OSError as e:
+				logger.error('parse verilog: yosys cannot be run: {}'.format(e))
+				exit(-1)
+			logger.debug('parse verilog: yosys output for {}:\n{}'.format(basename, proc.stdout))
+			if proc.returncode != 0:
+				print('ERR: yosys failed on {}:\n{}'.format(basename, proc.stdout))
+				return None
+			with open(path.join(work_dir, 'out.json'), 'r') as filename:
+				circuit_json = load(filename)
+		finally:
+			rmtree(work_dir)
+		circuit_json['top_module'] = top_module
+		makedirs(cache_dir, exist_ok=True)
+		with open(cache_file + '.part', 'w') as filename:
+			filename.write(dumps(circuit_json))
+		replace(cache_file + '.part', cache_file)
 	with open('{}.json'.format(basename), 'w') as filename:
 		filename.write(dumps(circuit_json, indent=True))
-	with open('{}.txt'.format(basename), 'w') as filename:
-		for port in sorted(circuit_json['modules'][top_module]['ports']):
-			bits = [str(i) for i in circuit_json['modules'][top_module]['ports'][port]['bits']]
-			for bit in sorted(bits):
-				filename.write('{}_{}: unimportant\n'.format(port, bit))
+	write_labeling_template(circuit_json['modules'][top_module], '{}.txt'.format(basename))
+	for module in get_gadget_modules(circuit_json):
+		write_labeling_template(circuit_json['modules'][module],
+			get_gadget_labeling_file(basename, module))
+	return '{}.json'.format(basename)
+
+def parse_verilog_batch(jobs, template_file='template/yosys.txt', gadgets=[]):
+	# yosys does the work in its own processes, threads only wait for it. A
+	# thread cannot end the run, so a missing yosys is reported up front.
+	if which('yosys') is None:
+		logger.error('parse verilog: yosys cannot be run: not found')
+		exit(-1)
+	with ThreadPool(min(len(jobs), cpu_count())) as p:
+		return p.starmap(parse_verilog,
+			[(verilog_files, top_module, template_file, 'tmp/cache', gadgets)
+				for verilog_files, top_module in jobs])
 
 def split_labeling(labeling):
 	secrets = []
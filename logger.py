@@ -3,8 +3,13 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import atexit
 import logging
 import os
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Queue
+from time import perf_counter, sleep
 
 # Make sure the work directory exists.
 path = os.getcwd()
@@ -16,10 +21,101 @@ if not os.path.exists(tmp_dir):
 		print('ERR: cannot create dir ' + str(tmp_dir))
 		exit()
 
+LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING,
+	'error': logging.ERROR}
+HOT_MODES = ('log', 'count', 'drop')
+
 logger = logging.getLogger()
-handler = logging.FileHandler('tmp/log.txt')
 formatter = logging.Formatter(
 				'%(asctime)s %(levelname)s %(message)s')
+handler = logging.FileHandler('tmp/log.txt', delay=True)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
+
+# Records of forked workers go through this queue to the listener of the
+# parent, which is the only process writing the log.
+queue = None
+listener = None
+# Set once a process writing to the queue was killed, it may have left the
+# queue locked.
+terminated = False
+# Diagnostics repeated per cell or wire are logged one by one (log), only
+# counted per kind (count) or discarded (drop).
+hot_mode = 'log'
+hot_counts = Counter()
+
+def setup_logging(level='debug', filename='tmp/log.txt', hot='log'):
+	global handler, queue, listener, hot_mode
+	logger.removeHandler(handler)
+	handler.close()
+	if filename == '-':
+		handler = logging.StreamHandler()
+	else:
+		handler = logging.FileHandler(filename, delay=True)
+	handler.setFormatter(formatter)
+	# The parent writes its own records directly, the handler lock keeps
+	# them apart from the ones the listener thread writes.
+	logger.addHandler(handler)
+	logger.setLevel(LEVELS[level])
+	hot_mode = hot
+	queue = Queue()
+	listener = QueueListener(queue, handler)
+	listener.start()
+	atexit.register(stop_logging)
+
+def stop_logging(timeout=1):
+	global listener
+	flush_hot()
+	if listener is None:
+		return
+	if not terminated:
+		# Every record put before the stop sentinel is written.
+		listener.stop()
+	else:
+		# A worker killed while writing to the queue leaves its lock taken,
+		# the stop sentinel could never be put. The records still queued are
+		# written for a while, but the listener is not joined.
+		time_start_abs = perf_counter()
+		while not queue.empty() and perf_counter() - time_start_abs < timeout:
+			sleep(0.01)
+	listener = None
+
+def workers_terminated():
+	# To be called before killing processes that may write to the queue.
+	global terminated
+	terminated = True
+
+def worker_init():
+	# Pool initializer, workers only put their records into the queue.
+	if queue is None:
+		return
+	if terminated:
+		# Waiting for the queue at exit would never return if it is locked.
+		queue.cancel_join_thread()
+	for h in list(logger.handlers):
+		logger.removeHandler(h)
+	logger.addHandler(QueueHandler(queue))
+
+def fork_init():
+	# A helper process forked by a worker is killed at any time, so it must
+	# not write to the queue. Its records are dropped.
+	for h in list(logger.handlers):
+		if isinstance(h, QueueHandler):
+			logger.removeHandler(h)
+	if not logger.handlers:
+		logger.addHandler(logging.NullHandler())
+
+def hot(kind, msg, *args, level=logging.WARNING):
+	# The message is only formatted if it is written.
+	if hot_mode == 'drop' or not logger.isEnabledFor(level):
+		return
+	if hot_mode == 'count':
+		hot_counts[kind] += 1
+	else:
+		logger.log(level, msg.format(*args))
+
+def flush_hot():
+	for kind, n in sorted(hot_counts.items()):
+		logger.warning('{}: {} times'.format(kind, n))
+	hot_counts.clear()
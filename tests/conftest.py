@@ -0,0 +1,23 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.join(ROOT, 'benchmarks')
+sys.path.insert(0, ROOT)
+
+# Test modules import the checkers and so the logger, whose records must not
+# end up in the log of the repository.
+from logger import setup_logging
+setup_logging('info', '-')
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+	# Logs and caches are written below the working directory, so every test
+	# gets its own.
+	monkeypatch.chdir(tmp_path)
+	return tmp_path
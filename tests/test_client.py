@@ -0,0 +1,54 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+from json import dumps, loads
+from socket import socket, AF_UNIX, SOCK_STREAM
+from subprocess import run, PIPE, STDOUT
+from threading import Thread
+import pytest
+from conftest import ROOT
+
+def serve(server, record, jobs):
+	# A daemon answering one job with the record, the job is kept in jobs.
+	conn = server.accept()[0]
+	with conn, conn.makefile('rw') as stream:
+		jobs.append(loads(stream.readline()))
+		stream.write(dumps(record) + '\n')
+		stream.flush()
+
+def client(workdir, record, *args):
+	# Returns the client process and the job received by the daemon.
+	socket_file = str(workdir / 'rebecca.sock')
+	jobs = []
+	with socket(AF_UNIX, SOCK_STREAM) as server:
+		server.bind(socket_file)
+		server.listen(1)
+		daemon = Thread(target=serve, args=(server, record, jobs))
+		daemon.start()
+		p = run([sys.executable, os.path.join(ROOT, 'client.py'), '-S', socket_file] + list(args),
+			stdout=PIPE, stderr=STDOUT, universal_newlines=True, timeout=60)
+		daemon.join()
+	return p, jobs[0]
+
+@pytest.mark.parametrize('record, code', [
+	({'result': [True, []]}, 0),
+	({'result': [False, ['and_1']]}, 1),
+	({'error': 'the job was aborted, see the log'}, 2),
+	({'result': [None, []]}, 3),
+	({'result': True}, 0),
+	({'result': False}, 1),
+], ids=['secure', 'insecure', 'error', 'unknown', 'independent', 'dependent'])
+def test_exit_code(workdir, record, code):
+	p = client(workdir, record, '-c', 'design.json', '1', 'labeling.txt', 't')[0]
+	assert p.returncode == code, p.stdout
+
+@pytest.mark.parametrize('option', ['-c', '-i'])
+def test_absolute_paths(workdir, option):
+	# The daemon resolves the paths in its own working directory.
+	args = ['design.json', '1', 'labeling.txt'] + (['t'] if option == '-c' else [])
+	job = client(workdir, {'result': True}, option, *args)[1]
+	design = job['check' if option == '-c' else 'independence_check']
+	assert design[:3] == [str(workdir / 'design.json'), '1', str(workdir / 'labeling.txt')]
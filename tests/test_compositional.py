@@ -0,0 +1,132 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+from json import dump, load
+import pytest
+from conftest import BENCHMARKS
+from CompositionalChecker import CompositionalChecker
+from helpers import generate_labeling
+
+def cell(ctype, **connections):
+	directions = dict((p, 'output' if p in ('Y', 'Q') else 'input') for p in connections)
+	return {'type': ctype, 'port_directions': directions,
+		'connections': dict((p, b if type(b) == list else [b]) for p, b in connections.items())}
+
+def module(ports, cells):
+	return {'ports': dict((p, {'direction': d, 'bits': b}) for p, (d, b) in ports.items()),
+		'cells': dict(('$c${}'.format(i), c) for i, c in enumerate(cells)), 'netnames': {}}
+
+# Share-wise XOR of a and b.
+XOR2 = module({'A': ('input', [2, 3]), 'B': ('input', [4, 5]), 'Q': ('output', [6, 7])},
+	[cell('$_XOR_', A=2, B=4, Y=6), cell('$_XOR_', A=3, B=5, Y=7)])
+XOR2_LABELING = 'A_2: share 1\nA_3: share 1\nB_4: share 2\nB_5: share 2\nQ_6: share 3\nQ_7: share 3\n'
+
+# HPC1: y is refreshed into registers before the DOM-indep multiplication.
+HPC1 = module({'C': ('input', [2]), 'X': ('input', [3, 4]), 'Y': ('input', [5, 6]),
+	'R': ('input', [7]), 'Z': ('input', [8]), 'Q': ('output', [9, 10])},
+	[cell('$_XOR_', A=5, B=7, Y=11), cell('$_XOR_', A=6, B=7, Y=12),
+	cell('$_DFF_P_', C=2, D=11, Q=13), cell('$_DFF_P_', C=2, D=12, Q=14),
+	cell('$_AND_', A=3, B=13, Y=15), cell('$_AND_', A=3, B=14, Y=16),
+	cell('$_AND_', A=4, B=13, Y=17), cell('$_AND_', A=4, B=14, Y=18),
+	cell('$_XOR_', A=16, B=8, Y=19), cell('$_XOR_', A=17, B=8, Y=20),
+	cell('$_DFF_P_', C=2, D=19, Q=21), cell('$_DFF_P_', C=2, D=20, Q=22),
+	cell('$_XOR_', A=15, B=21, Y=9), cell('$_XOR_', A=18, B=22, Y=10)])
+HPC1_LABELING = 'C_2: unimportant\nX_3: share 1\nX_4: share 1\nY_5: share 2\nY_6: share 2\n' + \
+	'R_7: mask\nZ_8: mask\nQ_9: share 3\nQ_10: share 3\n'
+
+# HPC1 with one output port per share.
+HPC1_PORTS = dict(HPC1, ports={**dict((p, HPC1['ports'][p]) for p in HPC1['ports'] if p != 'Q'),
+	'Q0': {'direction': 'output', 'bits': [9]}, 'Q1': {'direction': 'output', 'bits': [10]}})
+HPC1_PORTS_LABELING = HPC1_LABELING.replace('Q_9', 'Q0_9').replace('Q_10', 'Q1_10')
+
+def write_design(workdir, gadgets, top, labeling, gadget_labelings):
+	netlist = str(workdir / 'design.json')
+	with open(netlist, 'w') as filename:
+		dump({'top_module': 'top', 'modules': {'top': top, **gadgets}}, filename)
+	files = {}
+	for name, text in list(gadget_labelings.items()) + [('top', labeling)]:
+		files[name] = str(workdir / 'design_{}.txt'.format(name))
+		with open(files[name], 'w') as filename:
+			filename.write(text)
+	return netlist, files
+
+def check_gadget(workdir, name, gadget, labeling, mode, options={}):
+	# A top module with a single instance of the gadget.
+	ports = dict((p, (gadget['ports'][p]['direction'], gadget['ports'][p]['bits'])) for p in gadget['ports'])
+	top = module(ports, [{'type': name, 'port_directions': dict((p, d) for p, (d, b) in ports.items()),
+		'connections': dict((p, b) for p, (d, b) in ports.items())}])
+	netlist, files = write_design(workdir, {name: gadget}, top, labeling, {name: labeling})
+	checker = CompositionalChecker(netlist, generate_labeling(files['top']), 1, mode,
+		{name: files[name]}, options)
+	return checker.check()
+
+@pytest.mark.parametrize('cardinality', ['sum', 'pb', 'seq'])
+@pytest.mark.parametrize('encoding', ['bool', 'bv'])
+@pytest.mark.parametrize('mode', ['stable', 'transient'])
+def test_pini_gadgets(workdir, mode, encoding, cardinality):
+	options = {'encoding': encoding, 'cardinality': cardinality}
+	assert check_gadget(workdir, 'xor2', XOR2, XOR2_LABELING, mode, options) == (True, [])
+	assert check_gadget(workdir, 'hpc1', HPC1, HPC1_LABELING, mode, options) == (True, [])
+	assert check_gadget(workdir, 'hpc1', HPC1_PORTS, HPC1_PORTS_LABELING, mode, options) == (True, [])
+
+@pytest.mark.parametrize('cardinality', ['sum', 'pb', 'seq'])
+@pytest.mark.parametrize('mode', ['stable', 'transient'])
+def test_probing_secure_gadget_is_not_pini(workdir, mode, cardinality):
+	# DOM-indep is probing secure, but a probe on x0 y1 needs both shares.
+	with open(os.path.join(BENCHMARKS, 'first_order/dom_and/dom_and.json'), 'r') as filename:
+		dom = load(filename)
+	with open(os.path.join(BENCHMARKS, 'first_order/dom_and/dom_and.txt'), 'r') as filename:
+		labeling = filename.read()
+	check_res, gates = check_gadget(workdir, 'dom_and', dom['modules']['dom_and'], labeling, mode,
+		{'cardinality': cardinality})
+	assert check_res is False
+	assert gates
+
+def glue_design(workdir, mixed, share_ports=False):
+	# hpc1 multiplies x and y, xor2 adds w to the product. Adding up the two
+	# shares of the product in the glue logic unmasks it.
+	hpc1, hpc1_labeling = (HPC1_PORTS, HPC1_PORTS_LABELING) if share_ports else (HPC1, HPC1_LABELING)
+	product = {'Q0': [11], 'Q1': [12]} if share_ports else {'Q': [11, 12]}
+	top_cells = [
+		{'type': 'hpc1', 'port_directions': dict((p, hpc1['ports'][p]['direction']) for p in hpc1['ports']),
+			'connections': {'C': [2], 'X': [3, 4], 'Y': [5, 6], 'R': [7], 'Z': [8], **product}},
+		{'type': 'xor2', 'port_directions': dict((p, XOR2['ports'][p]['direction']) for p in XOR2['ports']),
+			'connections': {'A': [11, 12], 'B': [9, 10], 'Q': [13, 14]}}]
+	ports = {'C': ('input', [2]), 'X': ('input', [3, 4]), 'Y': ('input', [5, 6]), 'R': ('input', [7]),
+		'Z': ('input', [8]), 'W': ('input', [9, 10]), 'Q': ('output', [13, 14])}
+	if mixed:
+		top_cells.append(cell('$_XOR_', A=11, B=12, Y=15))
+		ports['P'] = ('output', [15])
+	top = module(ports, top_cells)
+	labeling = 'C_2: unimportant\nX_3: share 1\nX_4: share 1\nY_5: share 2\nY_6: share 2\n' + \
+		'R_7: mask\nZ_8: mask\nW_9: share 3\nW_10: share 3\nQ_13: unimportant\nQ_14: unimportant\n' + \
+		('P_15: unimportant\n' if mixed else '')
+	netlist, files = write_design(workdir, {'hpc1': hpc1, 'xor2': XOR2}, top, labeling,
+		{'hpc1': hpc1_labeling, 'xor2': XOR2_LABELING})
+	return CompositionalChecker(netlist, generate_labeling(files['top']), 1, 'transient',
+		{'hpc1': files['hpc1'], 'xor2': files['xor2']})
+
+@pytest.mark.parametrize('share_ports', [False, True], ids=['port', 'port per share'])
+def test_glue(workdir, share_ports):
+	assert glue_design(workdir, False, share_ports).check() == (True, [])
+	check_res, gates = glue_design(workdir, True, share_ports).check()
+	assert check_res is False
+
+def test_unknown_glue(workdir, monkeypatch):
+	# An unknown glue check must not end in a secure verdict.
+	import CompositionalChecker as module_under_test
+	monkeypatch.setattr(module_under_test.Z3Checker, 'check', lambda self, labeling=0: (None, []))
+	assert glue_design(workdir, False).check() == (None, [])
+
+def test_gadget_cache_version(workdir, monkeypatch):
+	# A verdict of another checker version is not reused.
+	import CompositionalChecker as module_under_test
+	assert check_gadget(workdir, 'xor2', XOR2, XOR2_LABELING, 'stable') == (True, [])
+	assert len(os.listdir('tmp/cache/gadgets')) == 1
+	assert check_gadget(workdir, 'xor2', XOR2, XOR2_LABELING, 'stable') == (True, [])
+	assert len(os.listdir('tmp/cache/gadgets')) == 1
+	monkeypatch.setattr(module_under_test, 'RESULT_CACHE_VERSION', module_under_test.RESULT_CACHE_VERSION + 1)
+	assert check_gadget(workdir, 'xor2', XOR2, XOR2_LABELING, 'stable') == (True, [])
+	assert len(os.listdir('tmp/cache/gadgets')) == 2
@@ -0,0 +1,26 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+from shutil import copy, copytree
+from subprocess import run, PIPE, STDOUT
+import pytest
+from conftest import ROOT, BENCHMARKS
+
+@pytest.mark.parametrize('designs', [['dom_and'], ['dom_and', 'isw_and']], ids=['single', 'batch'])
+def test_missing_yosys(workdir, designs):
+	copytree(os.path.join(ROOT, 'template'), str(workdir / 'template'))
+	args = []
+	for design in designs:
+		copy(os.path.join(BENCHMARKS, 'first_order', design, design + '.v'), str(workdir))
+		args += ['-p', design + '.v', design]
+	# No yosys on the path.
+	p = run([sys.executable, os.path.join(ROOT, 'verify.py')] + args, stdout=PIPE, stderr=STDOUT,
+		universal_newlines=True, timeout=60, env=dict(os.environ, PATH=str(workdir)))
+	assert p.returncode != 0
+	assert 'Traceback' not in p.stdout
+	with open('tmp/log.txt', 'r') as filename:
+		assert 'yosys cannot be run' in filename.read()
+	assert not [d for d in os.listdir('tmp') if d.startswith('yosys_')]
@@ -0,0 +1,43 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import sqlite3
+import ResultCache as result_cache
+from ResultCache import ResultCache
+
+LABELING = {'4': ['s_1', 'm_1'], '5': ['m_1']}
+
+def test_key():
+	key = ResultCache.key('digest', LABELING, 1, 'transient')
+	assert key == ResultCache.key('digest', dict(reversed(list(LABELING.items()))), 1, 'transient')
+	assert key != ResultCache.key('other', LABELING, 1, 'transient')
+	assert key != ResultCache.key('digest', {'4': ['s_1'], '5': ['m_1']}, 1, 'transient')
+	assert key != ResultCache.key('digest', LABELING, 2, 'transient')
+	assert key != ResultCache.key('digest', LABELING, 1, 'stable')
+
+def test_put_get(workdir):
+	cache = ResultCache()
+	key = ResultCache.key('digest', LABELING, 1, 'transient')
+	assert cache.get(key) is None
+	cache.put(key, False, ['xor_58'], 0.5)
+	assert ResultCache().get(key) == (False, ['xor_58'], 0.5)
+
+def test_version(workdir, monkeypatch):
+	# Verdicts of another checker version are dropped when the cache is opened.
+	key = ResultCache.key('digest', LABELING, 1, 'transient')
+	ResultCache().put(key, True, [], 0.5)
+	monkeypatch.setattr(result_cache, 'RESULT_CACHE_VERSION', result_cache.RESULT_CACHE_VERSION + 1)
+	cache = ResultCache()
+	assert cache.get(key) is None
+	cache.put(key, True, [], 0.5)
+	assert ResultCache().get(key) == (True, [], 0.5)
+
+def test_unversioned(workdir):
+	# A cache written before the version was recorded is not trusted.
+	key = ResultCache.key('digest', LABELING, 1, 'transient')
+	ResultCache().put(key, True, [], 0.5)
+	db = sqlite3.connect('tmp/cache/results.sqlite')
+	db.execute('PRAGMA user_version = 0')
+	db.close()
+	assert ResultCache().get(key) is None
@@ -0,0 +1,44 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+from ast import literal_eval
+from json import loads
+from subprocess import run, PIPE, STDOUT
+import pytest
+from conftest import ROOT, BENCHMARKS
+
+DOM_AND = [os.path.join(BENCHMARKS, 'first_order/dom_and/dom_and.json'), '1',
+	os.path.join(BENCHMARKS, 'first_order/dom_and/dom_and.txt')]
+ISW_AND = [os.path.join(BENCHMARKS, 'first_order/isw_and/isw_and.json'), '1',
+	os.path.join(BENCHMARKS, 'first_order/isw_and/isw_and.txt')]
+
+def verify(*args):
+	# Returns the last line printed.
+	p = run([sys.executable, os.path.join(ROOT, 'verify.py'), '--no-cache'] + list(args),
+		stdout=PIPE, stderr=STDOUT, universal_newlines=True, timeout=600)
+	assert p.returncode == 0, p.stdout
+	return p.stdout.strip().split('\n')[-1]
+
+@pytest.mark.parametrize('mode', ['s', 't'])
+def test_missing_backend(workdir, mode):
+	assert literal_eval(verify('--backend', 'no-such-solver', '--check', *DOM_AND, mode)) == (None, [])
+
+def test_portfolio_timeout(workdir):
+	# The only configuration never answers.
+	res = verify('--portfolio', 'sh -c "sleep 60"', '--timeout', '1', '--check', *DOM_AND, 't')
+	assert literal_eval(res) == (None, [])
+
+@pytest.mark.parametrize('design', [DOM_AND, ISW_AND], ids=['dom_and', 'isw_and'])
+def test_all_leaks_unknown(workdir, design):
+	# No leak is found, so the verdict is open and not secure.
+	res = loads(verify('--backend', 'no-such-solver', '--all-leaks', '--check', *design, 't'))
+	assert res == {'secure': None, 'leaks': 0}
+
+def test_all_leaks(workdir):
+	res = loads(verify('--all-leaks', '1', '--check', *ISW_AND, 't'))
+	assert res == {'secure': False, 'leaks': 1}
+	res = loads(verify('--all-leaks', '--check', *DOM_AND, 't'))
+	assert res == {'secure': True, 'leaks': 0}
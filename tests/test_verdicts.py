@@ -0,0 +1,83 @@
+# Copyright IAIK TU Graz.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+from ast import literal_eval
+from json import dump, load
+from subprocess import run, PIPE, STDOUT
+import pytest
+from conftest import ROOT, BENCHMARKS
+
+# name: (netlist, order, labeling, stable verdict, transient verdict)
+DESIGNS = {
+	'dom_and': ('first_order/dom_and/dom_and.json', 1, 'first_order/dom_and/dom_and.txt', True, True),
+	'false_positive': ('first_order/false_positive/out.json', 1, 'first_order/false_positive/l.txt', False, False),
+	'isw_and': ('first_order/isw_and/isw_and.json', 1, 'first_order/isw_and/isw_and.txt', True, False),
+	'ti_and': ('first_order/ti_and/ti_and.json', 1, 'first_order/ti_and/ti_and.txt', True, True),
+	'trichina': ('first_order/trichina/trichina.json', 1, 'first_order/trichina/trichina.txt', False, False),
+	'multiplier_1st': ('higher_order/multiplier_1st/dom_and_1st_order.json', 1,
+		'higher_order/multiplier_1st/mul_1st.txt', True, True),
+	'multiplier_2nd': ('higher_order/multiplier_2nd/dom_and_2nd_order.json', 2,
+		'higher_order/multiplier_2nd/labeling_template_2nd.txt', True, True),
+}
+
+OPTIONS = [[], ['-e', 'bv'], ['--prune-cone'], ['--prepass'], ['--cardinality', 'seq'],
+	['--cardinality', 'pb'], ['-s'], ['--split-secrets']]
+
+def verify(*args):
+	p = run([sys.executable, os.path.join(ROOT, 'verify.py')] + [str(a) for a in args],
+		stdout=PIPE, stderr=STDOUT, universal_newlines=True, timeout=600)
+	assert p.returncode == 0, p.stdout
+	return literal_eval(p.stdout.strip().split('\n')[-1])
+
+def check(name, mode, *options):
+	netlist, order, labeling, stable, transient = DESIGNS[name]
+	return verify(*options, '--check', os.path.join(BENCHMARKS, netlist), order,
+		os.path.join(BENCHMARKS, labeling), mode)
+
+@pytest.mark.parametrize('options', OPTIONS, ids=lambda o: ' '.join(o) or 'default')
+@pytest.mark.parametrize('name', sorted(DESIGNS))
+def test_verdict(workdir, name, options):
+	stable, transient = DESIGNS[name][3:]
+	assert check(name, 's', '--no-cache', *options)[0] == stable
+	assert check(name, 't', '--no-cache', *options)[0] == transient
+
+def test_incremental(workdir):
+	# Dropping the register in front of an output share of the DOM AND gate
+	# lets the glitches of both domains meet.
+	netlist, order, labeling = DESIGNS['dom_and'][:3]
+	netlist, labeling = os.path.join(BENCHMARKS, netlist), os.path.join(BENCHMARKS, labeling)
+	with open(netlist, 'r') as filename:
+		circuit = load(filename)
+	cells = circuit['modules'][circuit['top_module']]['cells']
+	cells['$auto$simplemap.cc:467:simplemap_dffsr$92'] = {'type': '$_NOT_',
+		'port_directions': {'A': 'input', 'Y': 'output'}, 'connections': {'A': [14], 'Y': [15]}}
+	changed = str(workdir / 'dom_and_changed.json')
+	with open(changed, 'w') as filename:
+		dump(circuit, filename)
+	for mode, expected in (('s', True), ('t', False)):
+		assert verify('--check', netlist, order, labeling, mode)[0]
+		assert verify('--no-cache', '--check', changed, order, labeling, mode)[0] == expected
+		assert verify('--incremental', netlist, '--check', changed, order, labeling, mode)[0] == expected
+
+@pytest.mark.parametrize('mode', ['s', 't'])
+def test_split_secrets_plain_secret(workdir, mode):
+	# A port labeled secret has no label left in the checks of the other
+	# secrets.
+	netlist, order, labeling = DESIGNS['dom_and'][:3]
+	netlist = os.path.join(BENCHMARKS, netlist)
+	with open(os.path.join(BENCHMARKS, labeling), 'r') as filename:
+		text = filename.read()
+	labeling = str(workdir / 'dom_and_secret.txt')
+	with open(labeling, 'w') as filename:
+		filename.write(text.replace('XxDI_4: share 1', 'XxDI_4: secret').replace('XxDI_5: share 1', 'XxDI_5: secret'))
+	assert verify('--no-cache', '--check', netlist, order, labeling, mode)[0] is False
+	assert verify('--no-cache', '--split-secrets', '--check', netlist, order, labeling, mode)[0] is False
+
+@pytest.mark.parametrize('name', ['dom_and', 'isw_and', 'trichina'])
+def test_both_modes(workdir, name):
+	# The last line is the verdict of the check in either mode.
+	stable, transient = DESIGNS[name][3:]
+	assert check(name, 'b', '--no-cache')[0] == (stable and transient)
@@ -4,16 +4,36 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from argparse import ArgumentParser, FileType
+from json import dumps, load
+from os import path
 from helpers import *
 from CircuitGraph import CircuitGraph
 from time import perf_counter, process_time
 from Z3Checker import Z3Checker
+from CompositionalChecker import CompositionalChecker
+from Daemon import Daemon
+from ResultCache import ResultCache
 from IndepChecker import IndepChecker
-from sys import setrecursionlimit
-from multiprocessing import Pool
-from logger import logger
+from multiprocessing import Pool, cpu_count
+from logger import logger, setup_logging, worker_init, workers_terminated, LEVELS, HOT_MODES
 
-setrecursionlimit(10000)
+# Parsed netlists of this run; forked workers inherit them from the parent.
+circuits = {}
+# Persistent verdicts of earlier runs, None if the cache is bypassed.
+results = None
+# Seconds spent loading and labeling every netlist before the checks start.
+setup_times = {}
+# File the per-labeling statistics are appended to as JSON lines, if any.
+stats_file = None
+
+def get_circuit(circuit_file, labeling):
+	if circuit_file not in circuits:
+		time_start_abs = perf_counter()
+		circuits[circuit_file] = CircuitGraph.load(circuit_file)
+		setup_times.setdefault(circuit_file, {})['load'] = perf_counter() - time_start_abs
+	circuit = circuits[circuit_file]
+	circuit.set_labeling(labeling)
+	return circuit
 
 def check_file(file_name, file_ending, file_type):
 	if not file_name.endswith(file_ending):
@@ -21,16 +41,105 @@ def check_file(file_name, file_ending, file_type):
 		exit()
 	return
 
-def verify_circuit(circuit_file, labeling, order, mode='transient', log='tmp/report.txt'):
+def get_design(netlist, order, labeling, mode, optimized=False):
+	check_file(netlist, '.json', 'parsed netlist')
+	check_file(labeling, '.txt', 'labeling')
+	time_start_abs = perf_counter()
+	if optimized:
+		labels = generate_optimized_labeling(labeling)
+	else:
+		labels = generate_labeling(labeling)
+	setup_times.setdefault(netlist, {})['labeling'] = perf_counter() - time_start_abs
+	if is_int(order):
+		order = int(order)
+	else:
+		print('ERR: order should be int')
+		exit()
+	if mode == 't':
+		mode = 'transient'
+	elif mode == 's':
+		mode = 'stable'
+	elif mode == 'b':
+		mode = 'both'
+	else:
+		print('ERR: mode should be either s, t or b')
+		exit()
+	logger.info('Verifying {} for {} order in {} mode'.format(
+		netlist, order, mode))
+	for l in labels:
+		logger.info('Initial labeling:\n{}'.format(get_pretty_labeling(
+			l, labeling)))
+	return netlist, order, mode, labels
+
+def get_cached_result(circuit, labeling, order, mode, secrets):
+	if results is None:
+		return None, None
+	key = ResultCache.key(circuit.get_digest(), labeling, order, mode)
+	cached = results.get(key)
+	if cached is None:
+		return None, key
+	check_res, gates, seconds = cached
+	logger.info('Result ({}): {}, {} (cached, checked in {}s)'.format(
+		secrets, check_res, gates, round(seconds, 2)))
+	return (check_res, gates), key
+
+def write_stats(circuit_file, secrets, order, mode, phases, check_res, gates, checker=None,
+	labeling=0):
+	# One record per checked labeling; the formula size costs a walk over
+	# the encoding, so it is only computed for the statistics file.
+	record = {'netlist': circuit_file, 'secrets': secrets, 'order': order, 'mode': mode,
+		'verdict': check_res, 'gates': gates,
+		'phases': dict((k, round(v, 4)) for k, v in phases.items())}
+	if checker is None:
+		record['cached'] = True
+	else:
+		record['statistics'] = checker.get_statistics()
+		if stats_file is not None:
+			record['size'] = checker.get_formula_size(labeling)
+	logger.info('Statistics: {}'.format(dumps(record)))
+	if stats_file is not None:
+		with open(stats_file, 'a') as filename:
+			filename.write(dumps(record) + '\n')
+
+def get_changed_cone(circuit, labeling, order, mode, previous):
+	# The nodes every probe set has to touch, None if the whole netlist has
+	# to be checked because there is no secure verdict of the previous one.
+	if previous is None:
+		return None
+	if results is None:
+		logger.warning('Incremental: the result cache is disabled, checking the whole netlist')
+		return None
+	old = get_circuit(previous, labeling)
+	cached = results.get(ResultCache.key(old.get_digest(), labeling, order, mode))
+	if cached is None or not cached[0]:
+		logger.info('Incremental: there is no secure verdict of {} for this labeling, checking the whole netlist'.
+			format(previous))
+		return None
+	return circuit.get_changed_cone(old)
+
+def verify_circuit(circuit_file, labeling, order, mode='transient', log='tmp/report.txt', options={},
+	previous=None):
 	secrets = ', '.join(
 		[var for k in labeling for var in labeling[k] if 's_' in var])
 	labels = labeling
+	phases = dict(setup_times.get(circuit_file, {}))
 	time_start_abs = perf_counter()
 	time_start_rel = process_time()
-	circuit = CircuitGraph(labels, json_file=circuit_file)
-	checker = Z3Checker(circuit.get_graph(), labels, order, mode)
+	circuit = get_circuit(circuit_file, labels)
+	phases['graph'] = perf_counter() - time_start_abs
+	cached, key = get_cached_result(circuit, labels, order, mode, secrets)
+	if cached:
+		write_stats(circuit_file, secrets, order, mode, phases, *cached)
+		return cached
+	changed = get_changed_cone(circuit, labels, order, mode, previous)
+	time_phase = perf_counter()
+	checker = Z3Checker(circuit.get_graph(), labels, order, mode, changed=changed, **options)
+	phases['encode'] = perf_counter() - time_phase
 	logger.info('Checking secrets: {}...'.format(secrets))
+	time_phase = perf_counter()
 	check_res, gates = checker.check()
+	phases['solve'] = perf_counter() - time_phase
+	write_stats(circuit_file, secrets, order, mode, phases, check_res, gates, checker)
 	time_end_abs = perf_counter()
 	time_end_rel = process_time()
 	rel_time = time_end_rel - time_start_rel
@@ -39,27 +148,325 @@ def verify_circuit(circuit_file, labeling, order, mode='transient', log='tmp/rep
 	logger.info('... secrets {} are checked in {}h{}m{}s'.format(
 		secrets, int(h_rel), int(m_rel), round(s_rel, 2)))
 	logger.info('Result ({}): {}, {}'.format(secrets, check_res, gates))
+	if key and check_res is not None:
+		results.put(key, check_res, gates, rel_time)
 	return (check_res, gates)
 
+def verify_circuit_shared(circuit_file, labelings, order, mode='transient', options={}, previous=None):
+	phases = dict(setup_times.get(circuit_file, {}))
+	time_phase = perf_counter()
+	circuit = get_circuit(circuit_file, labelings[0])
+	phases['graph'] = perf_counter() - time_phase
+	changed = None
+	if previous is not None:
+		cones = [get_changed_cone(circuit, l, order, mode, previous) for l in labelings]
+		if None not in cones:
+			changed = set().union(*cones)
+	checker = None
+	# An unknown labeling only decides the result if no other one leaks.
+	res = (True, [])
+	for i, labeling in enumerate(labelings):
+		secrets = ', '.join(
+			[var for k in labeling for var in labeling[k] if 's_' in var])
+		cached, key = get_cached_result(circuit, labeling, order, mode, secrets)
+		if cached:
+			write_stats(circuit_file, secrets, order, mode, phases, *cached)
+			if not cached[0]:
+				return cached
+			continue
+		if checker is None:
+			# The shared encoding is only built once a labeling is not cached.
+			time_start_rel = process_time()
+			time_phase = perf_counter()
+			checker = Z3Checker(circuit.get_graph(), labelings, order, mode, changed=changed, **options)
+			phases['encode'] = perf_counter() - time_phase
+			logger.info('Shared encoding of {} labelings is built in {}s'.format(
+				len(labelings), round(process_time() - time_start_rel, 2)))
+		logger.info('Checking secrets: {}...'.format(secrets))
+		time_start_rel = process_time()
+		time_phase = perf_counter()
+		check_res, gates = checker.check(i)
+		phases['solve'] = perf_counter() - time_phase
+		write_stats(circuit_file, secrets, order, mode, phases, check_res, gates, checker, i)
+		rel_time = process_time() - time_start_rel
+		m_rel, s_rel = divmod(rel_time, 60)
+		h_rel, m_rel = divmod(m_rel, 60)
+		logger.info('... secrets {} are checked in {}h{}m{}s'.format(
+			secrets, int(h_rel), int(m_rel), round(s_rel, 2)))
+		logger.info('Result ({}): {}, {}'.format(secrets, check_res, gates))
+		if key and check_res is not None:
+			results.put(key, check_res, gates, rel_time)
+		if check_res is None:
+			res = (check_res, gates)
+		elif not check_res:
+			return (check_res, gates)
+	return res
+
+def estimate_circuit(circuit_file, labeling, order, mode='transient', options={}):
+	# Builds the encoding without solving it, for --dry-run.
+	secrets = ', '.join(
+		[var for k in labeling for var in labeling[k] if 's_' in var])
+	phases = dict(setup_times.get(circuit_file, {}))
+	time_phase = perf_counter()
+	circuit = get_circuit(circuit_file, labeling)
+	phases['graph'] = perf_counter() - time_phase
+	time_phase = perf_counter()
+	checker = Z3Checker(circuit.get_graph(), labeling, order, mode, **options)
+	phases['encode'] = perf_counter() - time_phase
+	return {'netlist': circuit_file, 'secrets': secrets, 'order': order, 'mode': mode,
+		'phases': dict((k, round(v, 4)) for k, v in phases.items()),
+		'size': checker.get_formula_size()}
+
+def run_task(task):
+	i, (func, args) = task
+	return i, func(*args)
+
+def verify_secret(circuit_file, labeling, order, mode='transient', options={}, previous=None):
+	secret = ', '.join(
+		[var for k in labeling for var in labeling[k] if 's_' in var])
+	time_start_abs = perf_counter()
+	check_res, gates = verify_circuit(circuit_file, labeling, order, mode, options=options,
+		previous=previous)
+	return (secret, check_res, gates, perf_counter() - time_start_abs)
+
+def verify_independence(circuit_file, labeling_file, order, options={}):
+	labels = generate_labeling(labeling_file)[0]
+	circuit = get_circuit(circuit_file, labels)
+	checker = IndepChecker(circuit.get_graph(), labels, order, get_shares(labeling_file),
+		circuit.get_outputs(), **options)
+	return (checker.check(), [])
+
+def estimate_cost(circuit_file, labeling, order, mode):
+	# Only the relative cost matters for the schedule: the encoding grows with
+	# the nodes times the label variables, the number of probe sets with the
+	# order and transient mode tracks twice the variables of stable mode.
+	variables = set(l for k in labeling for l in labeling[k] if not l.startswith('y_'))
+	cost = len(circuits[circuit_file].get_redundant_graph()) * max(len(variables), 1) * order
+	return cost if mode == 'stable' else cost * 2
+
+def get_batch_tasks(manifest, options, indep_options, optimized=False, split_secrets=False):
+	# Every job of the manifest is expanded into one task per labeling, or
+	# per secret, each task being (cost, job, function, arguments).
+	with open(manifest, 'r') as filename:
+		entries = load(filename)
+	jobs = []
+	tasks = []
+	for entry in entries:
+		netlist = path.join(path.dirname(manifest), entry['netlist'])
+		labeling = path.join(path.dirname(manifest), entry['labeling'])
+		check = entry.get('check', 'check')
+		if check == 'independence':
+			check_file(netlist, '.json', 'parsed netlist')
+			check_file(labeling, '.txt', 'labeling')
+			if not is_int(str(entry['order'])):
+				print('ERR: order should be int')
+				exit()
+			order = int(entry['order'])
+			labels = generate_labeling(labeling)[0]
+			get_circuit(netlist, labels)
+			tasks.append((estimate_cost(netlist, labels, order, 'transient'), len(jobs),
+				verify_independence, (netlist, labeling, order, indep_options)))
+			jobs.append({'netlist': netlist, 'labeling': labeling, 'order': order, 'check': check})
+			continue
+		if check != 'check':
+			print('ERR: check should be either check or independence')
+			exit()
+		modes = [entry['mode']] if 'mode' in entry else entry.get('modes', ['s', 't'])
+		for m in modes:
+			netlist, order, mode, labels = get_design(netlist, str(entry['order']), labeling, m,
+				optimized)
+			get_circuit(netlist, labels[0])
+			if split_secrets or entry.get('split_secrets'):
+				labels = [sl for l in labels for sl in split_labeling(l)]
+			for l in labels:
+				tasks.append((estimate_cost(netlist, l, order, mode), len(jobs),
+					verify_circuit, (netlist, l, order, mode, 'tmp/report.txt', options)))
+			jobs.append({'netlist': netlist, 'labeling': labeling, 'order': order, 'mode': mode,
+				'check': check})
+	return jobs, tasks
+
+def run_batch(jobs, tasks):
+	# Longest-first: the pool hands out tasks in the given order, so the most
+	# expensive ones start at once instead of ending up at the tail.
+	tasks = sorted(tasks, key=lambda t: -t[0])
+	pending = [0] * len(jobs)
+	for cost, job, func, args in tasks:
+		pending[job] += 1
+	job_results = [(True, []) for job in jobs]
+	insecure = 0
+	unknown = 0
+	time_start_abs = perf_counter()
+	with Pool(min(len(tasks), cpu_count()), worker_init) as p:
+		for i, r in p.imap_unordered(run_task, enumerate((t[2], t[3]) for t in tasks)):
+			job = tasks[i][1]
+			pending[job] -= 1
+			# A leak decides the job, an unknown task only a job without leaks.
+			if r[0] is False or (r[0] is None and job_results[job][0]):
+				job_results[job] = r
+			if pending[job] == 0:
+				insecure += job_results[job][0] is False
+				unknown += job_results[job][0] is None
+				print(dumps({**jobs[job], 'result': job_results[job],
+					'seconds': round(perf_counter() - time_start_abs, 2)}), flush=True)
+		p.close()
+		p.join()
+	print(dumps({'jobs': len(jobs), 'insecure': insecure, 'unknown': unknown}))
+
+def verify_modes(circuit_file, labelings, order, options={}):
+	# Stable and transient mode on one encoding, the verdict of a mode is
+	# decided like a shared check and each mode keeps its solving time.
+	circuit = get_circuit(circuit_file, labelings[0])
+	time_phase = perf_counter()
+	checker = Z3Checker(circuit.get_graph(), labelings, order, 'both', **options)
+	res = {'netlist': circuit_file, 'order': order, 'encode': round(perf_counter() - time_phase, 2)}
+	for i, labeling in enumerate(labelings):
+		secrets = ', '.join(
+			[var for k in labeling for var in labeling[k] if 's_' in var])
+		logger.info('Checking secrets in both modes: {}...'.format(secrets))
+		for mode, (check_res, gates, seconds) in checker.check_modes(i).items():
+			logger.info('Result ({}, {}): {}, {}'.format(secrets, mode, check_res, gates))
+			if results is not None and check_res is not None:
+				results.put(ResultCache.key(circuit.get_digest(), labeling, order, mode),
+					check_res, gates, seconds)
+			prev = res.setdefault(mode, {'result': (True, []), 'seconds': 0})
+			prev['seconds'] += seconds
+			if prev['result'][0] is not False and (check_res is False or check_res is None):
+				prev['result'] = (check_res, gates)
+	for mode in ('stable', 'transient'):
+		res[mode]['seconds'] = round(res[mode]['seconds'], 2)
+	return res
+
+def find_max_order(circuit_file, labelings, order, mode='transient', options={}):
+	# One encoding for all labelings at the highest order, every labeling
+	# only has to be checked up to the lowest order found so far.
+	circuit = get_circuit(circuit_file, labelings[0])
+	checker = Z3Checker(circuit.get_graph(), labelings, order, mode, **options)
+	res = (order, [])
+	for i, labeling in enumerate(labelings):
+		secrets = ', '.join(
+			[var for k in labeling for var in labeling[k] if 's_' in var])
+		logger.info('Searching the maximum secure order of secrets: {}...'.format(secrets))
+		max_order, gates = checker.check_orders(i, res[0])
+		logger.info('Maximum secure order ({}): {}, {}'.format(secrets, max_order, gates))
+		if max_order < res[0] or gates is None:
+			res = (max_order, gates)
+		if res[0] == 0:
+			break
+	return res
+
+def find_all_leaks(circuit_file, labelings, order, mode='transient', limit=0, options={}):
+	circuit = get_circuit(circuit_file, labelings[0])
+	checker = Z3Checker(circuit.get_graph(), labelings, order, mode, **options)
+	# Returns the number of leaks found and whether the search was stopped by
+	# an unknown result, more leaks may then exist.
+	leaks = 0
+	unknown = False
+	for i, labeling in enumerate(labelings):
+		secrets = [var for k in labeling for var in labeling[k] if 's_' in var]
+		logger.info('Searching all leaks of secrets: {}...'.format(', '.join(secrets)))
+		for gates in checker.check_all(i, limit):
+			if gates is None:
+				logger.warning('The search for leaks of secrets {} ended with an unknown result'.
+					format(', '.join(secrets)))
+				unknown = True
+				break
+			print(dumps({'secrets': secrets, 'gates': gates}), flush=True)
+			leaks += 1
+	return leaks, unknown
+
 if __name__ == '__main__':
 	parser = ArgumentParser(prog='Rebecca',
 		description=' A tool for checking if a given netlist is side-channel analysis resistant',
 		epilog='Questions and suggestions can be sent to the email <email>')
 	parser.add_argument('-v', '--version', action='version', version='%(prog)s 0.9.2')
-	parser.add_argument('-p', '--parse-verilog', nargs=2,
+	parser.add_argument('-p', '--parse-verilog', nargs=2, action='append',
 		metavar=('<netlist>', '<top module>'),
-		help='parse verilog file and generate labeling template')
+		help='parse verilog file and generate labeling template; can be given several times to parse concurrently')
+	parser.add_argument('-g', '--gadgets', nargs='+', default=[], metavar='<module>',
+		help='keep the given modules as gadgets instead of flattening them when parsing, for --compositional')
 	parser.add_argument('-o', '--optimized', action='store_true',
 		help='run verification in parallel')
-	parser.add_argument('-c', '--check', nargs=4, metavar=('<netlist>', '<order>', '<labeling>', '<mode>'),
-		help='check if a parsed netlist <netlist> is <order>-order secure with the <labeling> as initial labeling; mode = s (stable) | t (transient)')
+	parser.add_argument('-s', '--shared-solver', action='store_true',
+		help='build the encoding once for all labelings and solve each labeling on a fresh solver over it, instead of one encoding per labeling')
+	parser.add_argument('--split-secrets', action='store_true',
+		help='check every secret on its own and in parallel on all cores')
+	parser.add_argument('-a', '--all-leaks', nargs='?', type=int, const=0, metavar='<limit>',
+		help='report every leaking probe set as a JSON line instead of stopping at the first one, at most <limit> per labeling')
+	parser.add_argument('-e', '--encoding', choices=['bool', 'bv'], default='bool',
+		help='encode the labels of a node as Boolean variables (bool) or as one bit-vector (bv)')
+	parser.add_argument('--cardinality', choices=['sum', 'pb', 'seq'], default='sum',
+		help='encode the probe budget as integer sum (sum), pseudo-Boolean constraint (pb) or sequential counter (seq)')
+	parser.add_argument('--backend', metavar='<solver>', default='z3',
+		help='solve with z3 (default) or with an external SAT solver command reading DIMACS, e.g. kissat')
+	parser.add_argument('--portfolio', nargs='+', default=[], metavar='<config>',
+		help='race solver configurations in separate processes and take the first answer: z3, seed:<n>, sat, parallel or the command of an external SAT solver')
+	parser.add_argument('--timeout', type=float, default=0, metavar='<seconds>',
+		help='report unknown if a labeling is not solved within <seconds>')
+	parser.add_argument('--memory', type=int, default=0, metavar='<MB>',
+		help='report unknown if solving a labeling needs more than <MB> of memory')
+	parser.add_argument('--prune-cone', action='store_true',
+		help='encode only the nodes in the cone of influence of the secrets')
+	parser.add_argument('--prepass', action='store_true',
+		help='exclude probing candidates by a fast label propagation before solving')
+	parser.add_argument('--no-cache', action='store_true',
+		help='neither read nor store verdicts in the persistent result cache')
+	parser.add_argument('--prune-cache', nargs='?', type=float, const=0, metavar='<days>',
+		help='remove cached verdicts older than <days> days, all of them by default')
+	parser.add_argument('--stats', metavar='<file>',
+		help='append phase timings, formula size and solver statistics of every checked labeling to <file> as JSON lines')
+	parser.add_argument('--dry-run', action='store_true',
+		help='only build the encoding of every labeling and print its size as JSON lines, without solving')
+	parser.add_argument('--find-order', action='store_true',
+		help='find the highest order up to <order> of --check the netlist is secure at and print the leak at the next order')
+	parser.add_argument('-c', '--check', nargs=4, action='append', metavar=('<netlist>', '<order>', '<labeling>', '<mode>'),
+		help='check if a parsed netlist <netlist> is <order>-order secure with the <labeling> as initial labeling; mode = s (stable) | t (transient) | b (both on one encoding); can be given several times')
+	parser.add_argument('--incremental', metavar='<previous netlist>',
+		help='check only the probe sets touching the fan-out of the nodes changed since <previous netlist>, given its secure verdict is cached')
+	parser.add_argument('--compositional', nargs=4, metavar=('<netlist>', '<order>', '<labeling>', '<mode>'),
+		help='check a netlist parsed with --gadgets by checking every distinct gadget once for PINI and then only the glue logic between the instances')
+	parser.add_argument('--gadget-labeling', nargs=2, action='append', default=[], metavar=('<module>', '<labeling>'),
+		help='labeling of the gadget <module> for --compositional; defaults to the template written when parsing')
 	parser.add_argument('-i', '--independence-check', nargs=3, metavar=('<netlist>', '<order>', '<labeling>'),
 		help='check if a parsed netlist <netlist> is <order>-order independent with the <labeling> as initial labeling')
+	parser.add_argument('-b', '--batch', metavar='<manifest>',
+		help='check all jobs of a JSON manifest on one process pool, scheduling the most expensive labelings first')
+	parser.add_argument('--daemon', nargs='?', const='tmp/rebecca.sock', metavar='<socket>',
+		help='serve check and independence-check jobs of client.py on the Unix socket <socket>, keeping parsed netlists and encodings in memory')
+	parser.add_argument('--daemon-memory', type=int, default=1024, metavar='<MB>',
+		help='evict the least recently used netlists and encodings of the daemon above this resident memory')
+	parser.add_argument('--log-level', choices=list(LEVELS), default='debug',
+		help='write log records of at least this level')
+	parser.add_argument('--log-file', default='tmp/log.txt', metavar='<file>',
+		help='write the log to <file>, - for stderr')
+	parser.add_argument('--log-hot', choices=HOT_MODES, default='log',
+		help='log the diagnostics repeated per cell or wire one by one (log), only their number (count) or not at all (drop)')
 	args = vars(parser.parse_args())
+	setup_logging(args['log_level'], args['log_file'], args['log_hot'])
+	options = {'encoding': args['encoding'], 'cardinality': args['cardinality']}
+	check_options = {'prune_cone': args['prune_cone'], 'prepass': args['prepass'],
+		'backend': args['backend'], 'portfolio': args['portfolio'], 'timeout': args['timeout'],
+		'memory': args['memory']}
+	if args['prune_cache'] is not None:
+		print('{} cached verdicts removed'.format(ResultCache().prune(args['prune_cache'])))
+	if not args['no_cache']:
+		results = ResultCache()
+	stats_file = args['stats']
+	if args['batch']:
+		jobs, tasks = get_batch_tasks(args['batch'], {**options, **check_options}, options,
+			args['optimized'], args['split_secrets'])
+		if tasks:
+			run_batch(jobs, tasks)
+		exit()
+	if args['daemon']:
+		Daemon(args['daemon'], {**options, **check_options}, results, args['daemon_memory']).serve()
+		exit()
 	if args['parse_verilog']:
-		netlist = args['parse_verilog'][0]
-		check_file(netlist, '.v', 'netlist')
-		parse_verilog(netlist, args['parse_verilog'][1])
+		for netlist, top_module in args['parse_verilog']:
+			check_file(netlist, '.v', 'netlist')
+		if len(args['parse_verilog']) == 1:
+			parse_verilog(*args['parse_verilog'][0], gadgets=args['gadgets'])
+		else:
+			parse_verilog_batch(args['parse_verilog'], gadgets=args['gadgets'])
 	if args['independence_check']:
 		labeling = args['independence_check'][2]
 		check_file(labeling, '.txt', 'labeling')
@@ -67,48 +474,106 @@ if __name__ == '__main__':
 		labels = generate_labeling(labeling)[0]
 		netlist = args['independence_check'][0]
 		check_file(netlist, '.json', 'parsed netlist')
-		circuit = CircuitGraph(labels, json_file=netlist)
+		circuit = get_circuit(netlist, labels)
 		if is_int(args['independence_check'][1]):
 			order = int(args['independence_check'][1])
 		else:
 			print('ERR: order should be int')
 			exit()
 		outputs = circuit.get_outputs()
-		checker = IndepChecker(circuit.get_graph(), labels, order, shares, outputs)
+		checker = IndepChecker(circuit.get_graph(), labels, order, shares, outputs, **options)
+		print(checker.check())
+	if args['compositional']:
+		netlist, order, mode, labels = get_design(*args['compositional'], args['optimized'])
+		checker = CompositionalChecker(netlist, labels, order, mode,
+			dict(args['gadget_labeling']), {**options, **check_options})
 		print(checker.check())
 	if args['check']:
-		labels = []
-		netlist = args['check'][0]
-		check_file(netlist, '.json', 'parsed netlist')
-		labeling = args['check'][2]
-		check_file(labeling, '.txt', 'labeling')
-		if args['optimized']:
-			labels = generate_optimized_labeling(labeling)
-		else:
-			labels = generate_labeling(labeling)
-		if is_int(args['check'][1]):
-			order = int(args['check'][1])
-		else:
-			print('ERR: order should be int')
-			exit()
-		if args['check'][3] == 't':
-			mode = 'transient'
-		elif args['check'][3] == 's':
-			mode = 'stable'
-		else:
-			print('ERR: mode should be either s or t')
+		designs = []
+		for netlist, order, labeling, mode in args['check']:
+			netlist, order, mode, labels = get_design(netlist, order, labeling, mode, args['optimized'])
+			designs.append((netlist, order, mode, labels))
+			get_circuit(netlist, labels[0])
+		options = {**options, **check_options}
+		if args['dry_run']:
+			for netlist, order, mode, labels in designs:
+				for l in labels:
+					print(dumps(estimate_circuit(netlist, l, order, mode, options)), flush=True)
 			exit()
-		logger.info('Verifying {} for {} order in {} mode'.format(
-			args['check'][0], order, mode))
-		for l in labels:
-			logger.info('Initial labeling:\n{}'.format(get_pretty_labeling(
-				l, labeling)))
-		pool_len = len(labels) if len(labels) <= 10 else 10
-		with Pool(pool_len) as p:
-			res = p.starmap(verify_circuit,
-				[(netlist, l, order, mode) for l in labels])
-		for r in res:
-			if not r[0]:
-				print(r)
+		previous = args['incremental']
+		if previous is not None:
+			if len(designs) != 1:
+				print('ERR: --incremental needs exactly one checked netlist')
 				exit()
-		print((True, []))
+			check_file(previous, '.json', 'parsed netlist')
+			if previous not in circuits:
+				circuits[previous] = CircuitGraph.load(previous)
+		if args['find_order']:
+			for netlist, order, mode, labels in designs:
+				max_order, gates = find_max_order(netlist, labels, order, mode, options)
+				print(dumps({'netlist': netlist, 'order': max_order, 'gates': gates}))
+			exit()
+		if args['all_leaks'] is not None:
+			leaks = 0
+			unknown = False
+			for netlist, order, mode, labels in designs:
+				found, incomplete = find_all_leaks(netlist, labels, order, mode, args['all_leaks'], options)
+				leaks += found
+				unknown = unknown or incomplete
+			# Without a leak, an unknown result leaves the verdict open.
+			print(dumps({'secure': False if leaks else None if unknown else True, 'leaks': leaks}))
+			exit()
+		# Designs checked in both modes report the verdict of every mode, the
+		# others are checked by the pool.
+		res = (True, [])
+		for netlist, order, mode, labels in designs:
+			if mode == 'both':
+				r = verify_modes(netlist, labels, order, options)
+				print(dumps(r), flush=True)
+				for m in ('stable', 'transient'):
+					if r[m]['result'][0] is False or (r[m]['result'][0] is None and res[0]):
+						res = r[m]['result']
+		if res[0] is False:
+			print(res)
+			exit()
+		designs = [d for d in designs if d[2] != 'both']
+		if not designs:
+			print(res)
+			exit()
+		if args['split_secrets']:
+			tasks = [(verify_secret, (netlist, sl, order, mode, options, previous))
+				for netlist, order, mode, labels in designs
+				for l in labels for sl in split_labeling(l)]
+			pool_len = min(len(tasks), cpu_count())
+		elif args['shared_solver']:
+			tasks = [(verify_circuit_shared, (netlist, labels, order, mode, options, previous))
+				for netlist, order, mode, labels in designs]
+			pool_len = 1
+		else:
+			tasks = [(verify_circuit, (netlist, l, order, mode, 'tmp/report.txt', options, previous))
+				for netlist, order, mode, labels in designs for l in labels]
+			pool_len = min(len(tasks), cpu_count())
+		# Results are consumed as they arrive and leaving the pool terminates
+		# the remaining workers as soon as one check fails. An unknown result
+		# is only reported if no other check fails. Otherwise the workers
+		# exit on their own, after their log records are written.
+		with Pool(pool_len, worker_init) as p:
+			for i, r in p.imap_unordered(run_task, enumerate(tasks)):
+				if args['split_secrets']:
+					secret, check_res, gates, seconds = r
+					print('{}: {} in {}s'.format(secret, (check_res, gates), round(seconds, 2)))
+					r = (check_res, gates)
+				if r[0] is None:
+					if len(designs) > 1:
+						print('{}: {}'.format(tasks[i][1][0], r))
+					res = r
+				elif not r[0]:
+					if len(designs) > 1:
+						print('{}: {}'.format(tasks[i][1][0], r))
+					else:
+						print(r)
+					workers_terminated()
+					exit()
+			p.close()
+			p.join()
+		print(res)